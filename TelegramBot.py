@@ -1,6 +1,12 @@
-from telegram.ext import Updater
+from queue import Queue
+from telegram import Bot
+from telegram.ext import Updater, JobQueue
+from telegram.utils.request import Request
 from typing import List
 from handlers import *
+from dispatcher import ChatDispatcher
+from models import registry
+from replies import reply_workers
 import os
 
 # Enable logging
@@ -12,8 +18,14 @@ MAIN, BEER, CAT = 0, 1, 2
 
 
 class TelegramBot:
-    def __init__(self):
-        self.__updater = Updater(os.environ['TELEGRAM_TOKEN'])
+    def __init__(self, chat_workers: int = None, async_workers: int = 4, preload: bool = True,
+                 base_url: str = None):
+        if chat_workers is None:
+            chat_workers = int(os.environ.get('BOT_CHAT_WORKERS', 8))
+        # Another Bot API server, e.g. a local one for load tests: http://127.0.0.1:8081/bot
+        base_url = base_url or os.environ.get('TELEGRAM_API_URL')
+
+        self.__updater = self.__create_updater(chat_workers, async_workers, base_url)
         self.__dispatcher = self.__updater.dispatcher
         self.__logger = logging.getLogger(__file__)
 
@@ -22,22 +34,48 @@ class TelegramBot:
         self.__dispatcher.add_handler(handler)
         self.__dispatcher.add_handler(HelpHandler().create())
 
+        # Models load in the background while the bot connects, the first message that needs one waits for it
+        self.__preload_threads = registry.preload() if preload else []
+
+    @property
+    def preload_threads(self):
+        return self.__preload_threads
+
+    @staticmethod
+    def __create_updater(chat_workers: int, async_workers: int, base_url: str = None) -> Updater:
+        if chat_workers <= 0:
+            return Updater(os.environ['TELEGRAM_TOKEN'], workers=async_workers, base_url=base_url,
+                           request_kwargs={'con_pool_size': async_workers + reply_workers() + 4})
+
+        # Every chat worker, run_async worker and reply worker, the updater, the job queue
+        # and the main thread can hold a connection
+        request = Request(con_pool_size=chat_workers + async_workers + reply_workers() + 4)
+        bot = Bot(os.environ['TELEGRAM_TOKEN'], request=request, base_url=base_url)
+
+        job_queue = JobQueue()
+        dispatcher = ChatDispatcher(bot, Queue(), workers=async_workers, job_queue=job_queue,
+                                    chat_workers=chat_workers)
+        job_queue.set_dispatcher(dispatcher)
+
+        # workers defaults to 4 and PTB refuses it together with a dispatcher
+        return Updater(dispatcher=dispatcher, workers=None)
+
     def __init_handlers(self) -> List[Handler]:
         main_message_handler = MainMessageHandler(MAIN, BEER)
-        # sent_handler_main = SentimentHandler(MAIN)
-        # sent_handler_beer = SentimentHandler(BEER)
+        # The sentiment model runs in its own process, BOT_SENTIMENT=1 turns it on
+        sentiment = os.environ.get('BOT_SENTIMENT', '0') == '1'
+        sent_handlers_main = [SentimentHandler(MAIN).create()] if sentiment else []
+        sent_handlers_beer = [SentimentHandler(BEER).create()] if sentiment else []
 
         return ConversationHandler(
                 entry_points=[StartHandler(MAIN).create(),
                               main_message_handler.create_start()],
                 states={
-                    MAIN: [
-                        # sent_handler_main.create(),
+                    MAIN: sent_handlers_main + [
                         HelpHandler().create(),
                         main_message_handler.create(),
                     ],
-                    BEER: [
-                        # sent_handler_beer.create(),
+                    BEER: sent_handlers_beer + [
                         HelpHandler().create(),
                         BeerHandler(MAIN).create(),
                     ]
@@ -45,7 +83,41 @@ class TelegramBot:
                 fallbacks=[EndHandler().create()]
             )
 
-    def start(self):
-        self.__logger.info("Start the Bot...")
-        self.__updater.start_polling()
+    @property
+    def updater(self) -> Updater:
+        return self.__updater
+
+    def start_webhook(self):
+        """
+        Serves updates on an embedded HTTP server: http://WEBHOOK_LISTEN:PORT/WEBHOOK_PATH.
+
+        Telegram is told to post to WEBHOOK_URL + WEBHOOK_PATH, it opens up to WEBHOOK_MAX_CONNECTIONS
+        connections at once, while BOT_CHAT_WORKERS sets how many chats are handled in parallel.
+        WEBHOOK_URL is the public https address, e.g. of the reverse proxy in front of the bot
+        """
+        url_path = os.environ.get('WEBHOOK_PATH', os.environ['TELEGRAM_TOKEN'])
+        webhook_url = os.environ.get('WEBHOOK_URL')
+        if not webhook_url:
+            # Without it PTB registers https://<listen address>:<port>/..., which Telegram rejects
+            raise ValueError('"WEBHOOK_URL" environment variable is not set, it is required in webhook mode!')
+
+        self.__updater.start_webhook(
+            listen=os.environ.get('WEBHOOK_LISTEN', '0.0.0.0'),
+            port=int(os.environ.get('PORT', 8443)),
+            url_path=url_path,
+            webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+            max_connections=int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', 40)),
+        )
+
+    def start(self, mode: str = None):
+        mode = mode or os.environ.get('BOT_MODE', 'polling')
+        self.__logger.info(f"Start the Bot ({mode})...")
+
+        if mode == 'webhook':
+            self.start_webhook()
+        elif mode == 'polling':
+            self.__updater.start_polling()
+        else:
+            raise ValueError(f'Unknown bot mode "{mode}", expected "polling" or "webhook"')
+
         self.__updater.idle()
@@ -0,0 +1,73 @@
+import string
+from typing import List
+
+from natasha import Doc
+from telegram import Message
+
+from cache import LRUCache, MISSING
+from lemmatizer import get_lemmatizer, tokenize
+from models import registry
+
+
+def natasha_lemmatize(sentence: str) -> List[str]:
+    sentence = sentence.translate(str.maketrans('', '', string.punctuation))
+    doc = Doc(sentence)
+    doc.segment(registry.get('segmenter'))
+    doc.tag_morph(registry.get('news_morph_tagger'))
+
+    morph_vocab = registry.get('morph_vocab')
+    for token in doc.tokens:
+        token.lemmatize(morph_vocab)
+    return [x.lemma for x in doc.tokens]
+
+
+class AnalyzedMessage:
+    """
+    Message text with its tokens, pymorphy2 lemmas and natasha lemmas, each computed on first use
+    """
+    def __init__(self, text: str):
+        self.__text = text
+        self.__tokens = None
+        self.__lemmas = None
+        self.__natasha_lemmas = None
+
+    @property
+    def text(self) -> str:
+        return self.__text
+
+    @property
+    def tokens(self) -> List[str]:
+        if self.__tokens is None:
+            self.__tokens = tokenize(self.__text)
+        return self.__tokens
+
+    @property
+    def lemmas(self) -> List[str]:
+        if self.__lemmas is None:
+            lemmatizer = get_lemmatizer()
+            self.__lemmas = [lemmatizer.normal_form(x) for x in self.tokens]
+        return self.__lemmas
+
+    @property
+    def natasha_lemmas(self) -> List[str]:
+        if self.__natasha_lemmas is None:
+            self.__natasha_lemmas = natasha_lemmatize(self.__text)
+        return self.__natasha_lemmas
+
+
+# Filters only see the message, so the analysis is shared through a cache keyed by the message
+_analyses = LRUCache(max_size=1024)
+
+
+def analyze(message: Message) -> AnalyzedMessage:
+    """
+    The analysis of a message, shared by every filter and handler that processes its update
+    """
+    key = (message.chat_id, message.message_id, message.edit_date)
+    analysis = _analyses.get(key)
+
+    if analysis is MISSING or analysis.text != (message.text or ''):
+        analysis = AnalyzedMessage(message.text or '')
+        _analyses.put(key, analysis)
+
+    return analysis
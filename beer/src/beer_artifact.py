@@ -0,0 +1,112 @@
+import hashlib
+import os
+import os.path as osp
+import pathlib
+import uuid
+import zipfile
+from typing import List, Optional, Set
+
+import numpy as np
+
+
+ARTIFACT_VERSION = 2
+ARTIFACT_PATH = osp.join(pathlib.Path(__file__).parent.parent, 'data/compiled')
+
+
+def hash_sources(paths: List[str]) -> str:
+    digest = hashlib.sha256(str(ARTIFACT_VERSION).encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BeerArtifact:
+    """
+    Precompiled beer feature space: feature matrix, names and image paths per beer, lemma sets per feature.
+
+    The matrix is stored as a plain .npy file so it can be memory-mapped,
+    everything else goes to a compact .npz index next to it.
+    Every save writes the matrix under a new name and the index points to it,
+    so renaming the index into place switches both files at once.
+    """
+    __features__ = 'features'
+    __index__ = 'index.npz'
+
+    def __init__(self, features: np.ndarray, names: List[str], images: List[str],
+                 lemmas: List[Set[str]], source_hash: str):
+        self.features = features
+        self.names = names
+        self.images = images
+        self.lemmas = lemmas
+        self.source_hash = source_hash
+
+    def save(self, path: str = ARTIFACT_PATH):
+        os.makedirs(path, exist_ok=True)
+
+        lemma_tokens = [token for lemma in self.lemmas for token in sorted(lemma)]
+        lemma_offsets = np.cumsum([0] + [len(lemma) for lemma in self.lemmas])
+
+        # A loaded artifact may still have the previous matrix memory-mapped, it is never overwritten
+        features_name = f'{self.__features__}.{uuid.uuid4().hex}.npy'
+        with open(osp.join(path, features_name), 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.features))
+
+        index_tmp = osp.join(path, f'{self.__index__}.{os.getpid()}.tmp')
+        with open(index_tmp, 'wb') as f:
+            np.savez(f,
+                     version=np.array(ARTIFACT_VERSION),
+                     source_hash=np.array(self.source_hash),
+                     features=np.array(features_name),
+                     shape=np.array(self.features.shape),
+                     names=np.array(self.names, dtype=str),
+                     images=np.array(self.images, dtype=str),
+                     lemma_tokens=np.array(lemma_tokens, dtype=str),
+                     lemma_offsets=lemma_offsets)
+        os.replace(index_tmp, osp.join(path, self.__index__))
+
+        # Matrices of previous saves and of compiles that crashed before their index was written
+        for name in os.listdir(path):
+            if name.startswith(self.__features__) and name != features_name:
+                try:
+                    os.remove(osp.join(path, name))
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(cls, path: str = ARTIFACT_PATH, mmap: bool = True) -> Optional['BeerArtifact']:
+        try:
+            index = np.load(osp.join(path, cls.__index__), allow_pickle=False)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return None
+
+        with index:
+            if int(index['version']) != ARTIFACT_VERSION:
+                return None
+
+            try:
+                features = np.load(osp.join(path, str(index['features'])), mmap_mode='r' if mmap else None,
+                                   allow_pickle=False)
+            except (OSError, ValueError):
+                return None
+
+            names = index['names'].tolist()
+            images = index['images'].tolist()
+            lemma_offsets = index['lemma_offsets']
+            # One row per beer, one lemma set per feature column
+            if features.shape != tuple(index['shape'].tolist()) or features.shape[0] != len(names) or \
+                    len(images) != len(names) or len(lemma_offsets) != features.shape[1] + 1:
+                return None
+
+            lemma_tokens = index['lemma_tokens'].tolist()
+            lemmas = [set(lemma_tokens[start:stop]) for start, stop in zip(lemma_offsets[:-1], lemma_offsets[1:])]
+
+            return cls(features, names, images, lemmas, str(index['source_hash']))
+
+
+if __name__ == '__main__':
+    from beer.src.beer_embedding import BeerEmbedding
+
+    BeerEmbedding(rebuild=True)
+    print(f'Compiled beer artifact to {ARTIFACT_PATH}')
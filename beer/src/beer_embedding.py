@@ -1,15 +1,20 @@
 from dataclasses import dataclass
+from itertools import chain
 import json
-import string
+import os
 import os.path as osp
 import pathlib
+from typing import List
 
 from PIL import Image
 
 import numpy as np
 import pandas as pd
 
-from natasha import Doc, NewsEmbedding, NewsMorphTagger, Segmenter, MorphVocab
+from analysis import natasha_lemmatize
+
+from beer.src.beer_artifact import BeerArtifact, hash_sources
+from beer.src.search import build_search
 
 
 def _listify(x):
@@ -29,34 +34,62 @@ class Beer:
 
 
 class BeerEmbedding:
-    def __init__(self):
-        with open(osp.join(pathlib.Path(__file__).parent.parent, 'data/beer_features.json'), 'r') as f:
+    __features_path__ = osp.join(pathlib.Path(__file__).parent.parent, 'data/beer_features.json')
+    __data_path__ = osp.join(pathlib.Path(__file__).parent.parent, 'data/beer_data.json')
+
+    def __init__(self, rebuild=False, search=None):
+        with open(self.__features_path__, 'r') as f:
             self.feature_space = json.load(f)
-        self._segmenter = Segmenter()
-        self._morph_tagger = NewsMorphTagger(NewsEmbedding())
-        self._morph_vocab = MorphVocab()
 
-        self._init_beer_table()
-        self._init_lemma()
+        source_hash = hash_sources([self.__features_path__, self.__data_path__])
+        artifact = None if rebuild else BeerArtifact.load()
+
+        if artifact is None or artifact.source_hash != source_hash:
+            self._init_beer_table()
+            self._init_lemma()
+            BeerArtifact(self._features, self._names, self._images, self._lemmas, source_hash).save()
+        else:
+            self._features = artifact.features
+            self._names = artifact.names
+            self._images = artifact.images
+            self._lemmas = artifact.lemmas
+            self._init_lemma_index()
+
+        self._search = build_search(search or os.environ.get('BEER_SEARCH', 'exact'), self._features)
 
     def _init_beer_table(self):
-        data = pd.read_json(osp.join(pathlib.Path(__file__).parent.parent, 'data/beer_data.json'))
-        features = []
-        images = []
-        names = []
-        for key in self.feature_space.keys():
-            data[key] = data[key].apply(
-                lambda x: list(map(str.lower, x)) if x is not np.nan and x is not None else [])
-        for name, row in data.iterrows():
-            vec = self.featurize(row)
-            if vec.sum() > 15:
-                features.append(vec)
-                images.append(row['img'])
-                names.append(name.replace('-', ' '))
-        features = np.vstack(features)
-        self._features = features
-        self._images = images
-        self._names = names
+        data = pd.read_json(self.__data_path__)
+        self._features, self._names, self._images = self._build_table(data)
+
+    def _build_table(self, data, min_features=15):
+        dim = sum(len(values) for values in self.feature_space.values())
+        cells = np.zeros((len(data), dim), dtype=bool)
+
+        offset = 0
+        for key, values in self.feature_space.items():
+            # First occurrence wins, as with list.index in featurize
+            columns = {}
+            for i, value in enumerate(values):
+                columns.setdefault(value, offset + i)
+            offset += len(values)
+
+            lengths = data[key].str.len()
+            present = lengths.notna().to_numpy()
+            flat = pd.Series(list(chain.from_iterable(data[key][present])), dtype=object).str.lower()
+
+            key_cols = flat.map(columns).to_numpy(dtype=float)
+            key_rows = np.repeat(np.flatnonzero(present), lengths[present].to_numpy(dtype=np.int64))
+
+            found = ~np.isnan(key_cols)
+            cells[key_rows[found], key_cols[found].astype(np.int64)] = True
+
+        keep = np.flatnonzero(cells.sum(1) > min_features)
+        features = cells[keep].astype(float)
+
+        names = data.index[keep].str.replace('-', ' ').tolist()
+        images = data['img'].iloc[keep].tolist()
+
+        return features, names, images
 
     def _init_lemma(self):
         lemmas = []
@@ -64,6 +97,19 @@ class BeerEmbedding:
             for v in values:
                 lemmas.append(set(self._preprocess_sentence(v)))
         self._lemmas = lemmas
+        self._init_lemma_index()
+
+    def _init_lemma_index(self):
+        # lemma -> (feature columns, weights): a query token adds 1 / |lemmas of the feature| to each column
+        lemma_index = {}
+        for column, feats in enumerate(self._lemmas):
+            for feat in feats:
+                lemma_index.setdefault(feat, []).append((column, 1. / len(feats)))
+        self._lemma_index = {
+            lemma: (np.array([column for column, _ in entries], dtype=np.int64),
+                    np.array([weight for _, weight in entries]))
+            for lemma, entries in lemma_index.items()
+        }
 
     def featurize(self, row):
         emb = []
@@ -78,20 +124,31 @@ class BeerEmbedding:
         return emb
 
     def _preprocess_sentence(self, sentence):
-        sentence = sentence.translate(str.maketrans('', '', string.punctuation))
-        doc = Doc(sentence)
-        doc.segment(self._segmenter)
-        doc.tag_morph(self._morph_tagger)
-        for token in doc.tokens:
-            token.lemmatize(self._morph_vocab)
-        tokens = [_.lemma for _ in doc.tokens]
-        return tokens
-
-    def match(self, sentence, k=3):
-        tokens = self._preprocess_sentence(sentence)
-        emb = np.zeros_like(self._features[0])
-        for i, feats in enumerate(self._lemmas):
-            emb[i] = sum(token == feat for feat in feats for token in tokens) / len(feats)
-        emb = np.clip(emb, 0., 1.)
-        suggestions = ((emb - self._features) ** 2).sum(1).argpartition(k)[:k]
+        return natasha_lemmatize(sentence)
+
+    def _embed(self, tokens: List[str]) -> np.ndarray:
+        emb = np.zeros(self._features.shape[1])
+        for token in tokens:
+            entry = self._lemma_index.get(token)
+            if entry is not None:
+                columns, weights = entry
+                emb[columns] += weights
+        return np.clip(emb, 0., 1.)
+
+    def match(self, sentence, k=3, tokens: List[str] = None):
+        if tokens is None:
+            tokens = self._preprocess_sentence(sentence)
+
+        emb = self._embed(tokens)
+        suggestions = self._search.search(emb, k)
         return [Beer(self._names[i], self._images[i]) for i in suggestions]
+
+    def _embed_batch(self, sentences: List[str]) -> np.ndarray:
+        return np.vstack([self._embed(self._preprocess_sentence(sentence)) for sentence in sentences])
+
+    def match_batch(self, sentences: List[str], k=3) -> List[List[Beer]]:
+        if len(sentences) == 0:
+            return []
+
+        suggestions = self._search.search_batch(self._embed_batch(sentences), k)
+        return [[Beer(self._names[i], self._images[i]) for i in row] for row in suggestions]
@@ -0,0 +1,148 @@
+import argparse
+import hashlib
+import json
+import os
+import os.path as osp
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from PIL import Image
+
+
+def _render(source: str, target: str, max_size: int, image_format: str, quality: int) -> str:
+    with Image.open(source) as img:
+        img = img.convert('RGB')
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+
+        # Rename into place so concurrent readers never see a partial file,
+        # the temporary name is unique because reply threads may render the same image at once
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', prefix=osp.basename(target) + '.', dir=osp.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                img.save(f, format=image_format, quality=quality, optimize=True)
+            os.replace(tmp, target)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    return target
+
+
+class ImageStore:
+    """
+    Content-addressed cache of Telegram-sized image derivatives.
+
+    A derivative is named by the hash of the source bytes and the render settings,
+    a manifest of source stats lets unchanged images skip hashing on later runs.
+    """
+    __manifest__ = 'manifest.json'
+    __extensions__ = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+    def __init__(self, cache_dir: str = 'cache/images', max_size: int = 1280,
+                 image_format: str = 'JPEG', quality: int = 85):
+        if image_format not in self.__extensions__:
+            raise ValueError(f'Unsupported image format "{image_format}", expected one of {list(self.__extensions__)}')
+
+        self.__cache_dir = cache_dir
+        self.__max_size = max_size
+        self.__format = image_format
+        self.__quality = quality
+        self.__lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(osp.join(cache_dir, self.__manifest__), 'r') as f:
+                self.__manifest = json.load(f)
+        except (OSError, ValueError):
+            self.__manifest = {}
+
+    def __settings(self) -> str:
+        return f'{self.__max_size}:{self.__format}:{self.__quality}'
+
+    def __stat(self, source: str) -> List:
+        stat = os.stat(source)
+        return [stat.st_mtime_ns, stat.st_size, self.__settings()]
+
+    def __target(self, source: str) -> str:
+        digest = hashlib.sha256(self.__settings().encode())
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+
+        return osp.join(self.__cache_dir, f'{digest.hexdigest()}.{self.__extensions__[self.__format]}')
+
+    def __cached(self, source: str) -> Optional[str]:
+        with self.__lock:
+            entry = self.__manifest.get(source)
+
+        if entry is not None and entry['stat'] == self.__stat(source) and osp.exists(entry['target']):
+            return entry['target']
+
+        return None
+
+    def __remember(self, source: str, target: str):
+        with self.__lock:
+            self.__manifest[source] = {'stat': self.__stat(source), 'target': target}
+
+    def save_manifest(self):
+        with self.__lock:
+            tmp = osp.join(self.__cache_dir, self.__manifest__ + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(self.__manifest, f)
+            os.replace(tmp, osp.join(self.__cache_dir, self.__manifest__))
+
+    def get(self, source: str) -> str:
+        target = self.__cached(source)
+        if target is not None:
+            return target
+
+        target = self.__target(source)
+        if not osp.exists(target):
+            _render(source, target, self.__max_size, self.__format, self.__quality)
+
+        self.__remember(source, target)
+        self.save_manifest()
+
+        return target
+
+    def build(self, sources: List[str], workers: int = None) -> int:
+        pending = {}
+        for source in sources:
+            if self.__cached(source) is not None:
+                continue
+
+            target = self.__target(source)
+            if osp.exists(target):
+                self.__remember(source, target)
+            else:
+                pending[source] = target
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                source: executor.submit(_render, source, target, self.__max_size, self.__format, self.__quality)
+                for source, target in pending.items()
+            }
+
+            for source, future in futures.items():
+                self.__remember(source, future.result())
+
+        self.save_manifest()
+
+        return len(pending)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build Telegram-sized derivatives of beer images')
+    parser.add_argument('--images', default='beer/data/images')
+    parser.add_argument('--cache-dir', default='cache/images')
+    parser.add_argument('--max-size', type=int, default=1280)
+    parser.add_argument('--format', default='JPEG', choices=['JPEG', 'WEBP'])
+    parser.add_argument('--quality', type=int, default=85)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    store = ImageStore(args.cache_dir, args.max_size, args.format, args.quality)
+    sources = [osp.join(args.images, name) for name in sorted(os.listdir(args.images))]
+    print(f'Rendered {store.build(sources, args.workers)} of {len(sources)} images into {args.cache_dir}')
@@ -1,71 +1,155 @@
+import argparse
 import json
-
+import logging
 import os
 import os.path as osp
-
-import string
-import ssl
-
-from typing import List
-
-import urllib.request
-import urllib.error
-from urllib.parse import urljoin
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+from urllib.parse import urljoin, urlsplit
 
 import bs4
-
+import requests
+import urllib3
 from tqdm.auto import tqdm
 
-
-ssl._create_default_https_context = ssl._create_unverified_context
+from concurrency import RateLimiter
+from http_client import HttpClient
 
 
 class BeerScraper:
+    """
+    Scrapes the beer catalog with a pool of workers.
+
+    Every parsed product is appended to `data.jsonl` right away, so an interrupted run
+    continues where it stopped: products from the checkpoint and images on disk are not fetched again.
+    """
     __base_url__ = 'https://spb.winestyle.ru'
 
     __product_attrs_ = {'Пиво', 'Стиль', 'Регион', 'Производитель', 'Бренд', 'Тип ферментации', 'Крепость', 'Объем'}
 
-    def __init__(self, path, category='beer'):
+    def __init__(self, path, category='beer', base_url: str = None, workers: int = 8,
+                 requests_per_second: float = 5., verify_ssl: bool = False):
         self.path = path
         self.img_path = osp.join(path, 'images')
         self.category = category
+        self.checkpoint_path = osp.join(path, 'data.jsonl')
+
+        self.__logger = logging.getLogger(__file__)
+        self.__base_url = base_url or self.__base_url__
+        self.__workers = workers
+        self.__requests_per_second = requests_per_second
+        self.__verify_ssl = verify_ssl
+        self.__http = HttpClient(max_connections_per_host=workers)
+
+        self.__limiters = {}
+        self.__limiters_lock = threading.Lock()
+        self.__checkpoint_lock = threading.Lock()
+
+        if not verify_ssl:
+            # The catalog has been served with a broken certificate chain
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
         os.makedirs(self.img_path, exist_ok=True)
 
-    def parse(self, max_idx=None):
-        bar = tqdm()
-        idx = 0
+    def __limiter(self, url: str) -> RateLimiter:
+        host = urlsplit(url).netloc
+
+        with self.__limiters_lock:
+            if host not in self.__limiters:
+                self.__limiters[host] = RateLimiter(self.__requests_per_second, burst=self.__workers)
+            return self.__limiters[host]
+
+    def __get(self, url: str) -> requests.Response:
+        self.__limiter(url).acquire()
+        response = self.__http.get(url, verify=self.__verify_ssl)
+        response.raise_for_status()
+        return response
+
+    def load_checkpoint(self) -> Dict[str, dict]:
         data = {}
-        while True:
-            idx += 1
-            try:
-                for product in self.parse_single_page(idx):
-                    try:
-                        parsed_product = self.parse_product(product)
-                        data[osp.basename(product)[:-5]] = parsed_product
-                    except Exception as e:
-                        print(e)
-                        print(product)
-                    bar.update(1)
-            except urllib.error.HTTPError:
-                break
-            if max_idx is not None and idx == max_idx:
-                break
+        if not osp.exists(self.checkpoint_path):
+            return data
+
+        with open(self.checkpoint_path, 'r', encoding='utf8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line is cut if the previous run was killed while writing it
+                    continue
+                data[record['id']] = record['product']
+
+        return data
+
+    def __save_product(self, key: str, product: dict):
+        line = json.dumps({'id': key, 'product': product}, ensure_ascii=False)
+
+        with self.__checkpoint_lock, open(self.checkpoint_path, 'a', encoding='utf8') as f:
+            f.write(line + '\n')
+
+    def __parse_and_save(self, product: str):
+        parsed_product = self.parse_product(product)
+        self.__save_product(self.product_key(product), parsed_product)
+        return parsed_product
+
+    @staticmethod
+    def product_key(product: str) -> str:
+        return osp.basename(product)[:-5]
+
+    def parse(self, max_idx=None):
+        data = self.load_checkpoint()
+        bar = tqdm(initial=len(data))
+
+        with ThreadPoolExecutor(max_workers=self.__workers, thread_name_prefix='scraper') as executor:
+            futures = {}
+            queued = set()
+            idx = 0
+            while max_idx is None or idx < max_idx:
+                idx += 1
+                try:
+                    products = self.parse_single_page(idx)
+                except requests.HTTPError:
+                    break
+                if len(products) == 0:
+                    break
+
+                for product in products:
+                    key = self.product_key(product)
+                    if key not in data and key not in queued:
+                        queued.add(key)
+                        futures[executor.submit(self.__parse_and_save, product)] = key
+
+            for future in as_completed(futures):
+                try:
+                    data[futures[future]] = future.result()
+                except Exception as e:
+                    self.__logger.warning(f"Can't parse {futures[future]}: {e}")
+                bar.update(1)
+
+        bar.close()
         with open(osp.join(self.path, 'data.json'), 'w') as f:
             json.dump(data, f)
         return data
 
+    def __download_image(self, url: str, save_path: str):
+        if osp.exists(save_path) and osp.getsize(save_path) > 0:
+            return
+
+        tmp_path = f'{save_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.__get(url).content)
+        os.replace(tmp_path, save_path)
+
     def parse_product(self, product: str):
         if product.startswith('/'):
             product = product[1:]
-        url = urljoin(self.__base_url__, product)
-        request = urllib.request.Request(url)
-        html = urllib.request.urlopen(request).read()
+        url = urljoin(self.__base_url, product)
+        html = self.__get(url).content
         soup = bs4.BeautifulSoup(html, 'html.parser')
         list_desc = soup.find('ul', 'list-description list-description-lined')
         data = {}
         for el in list_desc.find_all('li', ''):
-            # print(el.get_text())
             parsed = el.get_text().replace(':', '')
             parsed = parsed.replace(' / ', '/')
             if len(el) == 0:
@@ -74,10 +158,10 @@ class BeerScraper:
             if field in self.__product_attrs_:
                 data[field] = ' '.join(attrs.split()).split(', ')
 
-        img_url = soup.find('a', 'img-container fancybox')['href']
+        img_url = urljoin(url, soup.find('a', 'img-container fancybox')['href'])
         product_name = osp.basename(product)
         save_path = osp.join(self.img_path, product_name[:-5] + '.' + img_url.split('.')[-1])
-        urllib.request.urlretrieve(img_url, save_path)
+        self.__download_image(img_url, save_path)
         data['img'] = save_path
         data['price'] = soup.find('div', 'price').text
 
@@ -99,9 +183,8 @@ class BeerScraper:
         return data
 
     def parse_single_page(self, idx: int) -> List[str]:
-        url = urljoin(self.__base_url__, f'beer/all/?page={idx}')
-        request = urllib.request.Request(url)
-        html = urllib.request.urlopen(request).read()
+        url = urljoin(self.__base_url, f'beer/all/?page={idx}')
+        html = self.__get(url).content
 
         soup = bs4.BeautifulSoup(html, 'html.parser')
         hrefs = [p.a['href'] for p in soup.find_all('p', 'title')]
@@ -109,16 +192,13 @@ class BeerScraper:
 
 
 if __name__ == '__main__':
-    scraper = BeerScraper('../data')
-    req = urllib.request.Request('https://spb.winestyle.ru/products/Lindemans-Gueuze.html')
-    html = urllib.request.urlopen(req).read()
-    soup = bs4.BeautifulSoup(html, 'html.parser')
-
-    # print(soup.prettify())
-    # print(soup.find(text='Состав:').parent.parent.parent.text.replace(',', '').split())
-    scraper.parse()
-    # s = soup.find_all('div', 'tag-block')
-    # print(s[0].find_all('a'))
-    # print(s.translate(str.maketrans('', '', string.punctuation)).split())
-    # print(soup.find_all('div', 'description-block'))
-    # print(scraper.parse_product('products/Lindemans-Gueuze.html'))
+    parser = argparse.ArgumentParser(description='Scrape the beer catalog, run again to resume')
+    parser.add_argument('--path', default='beer/data')
+    parser.add_argument('--base-url', default=None)
+    parser.add_argument('--max-pages', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rps', type=float, default=5., help='requests per second per host')
+    args = parser.parse_args()
+
+    scraper = BeerScraper(args.path, base_url=args.base_url, workers=args.workers, requests_per_second=args.rps)
+    print(f'Scraped {len(scraper.parse(args.max_pages))} products')
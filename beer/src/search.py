@@ -0,0 +1,100 @@
+from typing import List
+
+import numpy as np
+
+
+class ExactSearch:
+    """
+    Exact nearest neighbours by squared euclidean distance.
+
+    ||q - f||^2 = ||q||^2 - 2 q.f + ||f||^2, and ||q||^2 does not change the ranking,
+    so a query costs one matrix-vector product against precomputed row norms.
+    """
+    def __init__(self, features: np.ndarray):
+        self._features = features
+        self._norms = np.einsum('ij,ij->i', features, features)
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        return self._norms - 2 * (self._features @ query)
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        scores = self._scores(query)
+        k = min(k, len(scores))
+        top = np.argpartition(scores, k - 1)[:k]
+        return top[np.argsort(scores[top], kind='stable')]
+
+    def search_batch(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        scores = self._norms - 2 * (queries @ self._features.T)
+        k = min(k, scores.shape[1])
+        top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+        return list(np.take_along_axis(top, order, axis=1))
+
+
+class IVFSearch(ExactSearch):
+    """
+    Approximate nearest neighbours with an inverted file index.
+
+    Rows are clustered with k-means, a query is scored only against
+    the rows of its `n_probe` closest clusters.
+    """
+    def __init__(self, features: np.ndarray, n_lists: int = 128, n_probe: int = 32, n_iter: int = 10, seed: int = 0):
+        super().__init__(features)
+        n_lists = max(1, min(n_lists, len(features)))
+        self._n_probe = min(n_probe, n_lists)
+
+        rng = np.random.default_rng(seed)
+        centroids = np.asarray(features[rng.choice(len(features), n_lists, replace=False)], dtype=float)
+
+        for _ in range(n_iter):
+            assignment = self.__assign(centroids)
+            order = np.argsort(assignment, kind='stable')
+            counts = np.bincount(assignment, minlength=n_lists)
+            nonempty = counts > 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+            centroids[nonempty] = np.add.reduceat(features[order], starts) / counts[nonempty, None]
+
+        assignment = self.__assign(centroids)
+        order = np.argsort(assignment, kind='stable')
+
+        # Rows of a list are stored contiguously, so probing a list is a slice instead of a gather
+        self._centroids = centroids
+        self._centroid_norms = (centroids ** 2).sum(1)
+        self._order = order
+        self._list_features = np.ascontiguousarray(features[order])
+        self._list_norms = self._norms[order]
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+
+    def __assign(self, centroids: np.ndarray) -> np.ndarray:
+        return ((centroids ** 2).sum(1) - 2 * (self._features @ centroids.T)).argmin(1)
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        centroid_scores = self._centroid_norms - 2 * (self._centroids @ query)
+        probes = np.argpartition(centroid_scores, self._n_probe - 1)[:self._n_probe]
+
+        positions = np.concatenate([np.arange(self._offsets[i], self._offsets[i + 1]) for i in probes])
+        scores = np.concatenate([
+            self._list_norms[self._offsets[i]:self._offsets[i + 1]]
+            - 2 * (self._list_features[self._offsets[i]:self._offsets[i + 1]] @ query)
+            for i in probes
+        ])
+
+        k = min(k, len(scores))
+        top = np.argpartition(scores, k - 1)[:k]
+        return self._order[positions[top[np.argsort(scores[top], kind='stable')]]]
+
+    def search_batch(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        return [self.search(query, k) for query in queries]
+
+
+SEARCH_BACKENDS = {
+    'exact': ExactSearch,
+    'ivf': IVFSearch,
+}
+
+
+def build_search(name: str, features: np.ndarray, **kwargs) -> ExactSearch:
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f'Unknown search backend "{name}", expected one of {list(SEARCH_BACKENDS)}')
+
+    return SEARCH_BACKENDS[name](features, **kwargs)
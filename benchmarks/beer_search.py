@@ -0,0 +1,73 @@
+"""
+Recall and latency of BeerEmbedding search backends against the original brute-force match.
+
+Run from the repository root: python -m benchmarks.beer_search --rows 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from beer.src.beer_embedding import BeerEmbedding
+from beer.src.search import SEARCH_BACKENDS, build_search
+from benchmarks.beer_table import load_catalog
+
+
+def brute_force(features: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    return ((query - features) ** 2).sum(1).argpartition(k)[:k]
+
+
+def make_queries(features: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+    # Queries mention a handful of features, like a lemmatized beer request does
+    queries = np.zeros((n, features.shape[1]))
+    for query in queries:
+        columns = rng.choice(features.shape[1], rng.integers(1, 6), replace=False)
+        query[columns] = rng.choice([0.5, 1.], len(columns))
+    return queries
+
+
+def recall(features: np.ndarray, query: np.ndarray, found: np.ndarray, k: int) -> float:
+    # Catalog rows are binary, so distances tie a lot: any row as close as the k-th true neighbour is a hit
+    distances = ((query - features) ** 2).sum(1)
+    threshold = np.partition(distances, k - 1)[k - 1]
+    return float((distances[found] <= threshold + 1e-9).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--catalog', default='beer/data/beer.csv')
+    parser.add_argument('--features', default='beer/data/beer_features.json')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('-k', type=int, default=3)
+    args = parser.parse_args()
+
+    model = BeerEmbedding.__new__(BeerEmbedding)
+    with open(args.features, 'r') as f:
+        model.feature_space = json.load(f)
+
+    features, _, _ = model._build_table(load_catalog(args.catalog, model.feature_space, args.rows))
+    queries = make_queries(features, args.queries, np.random.default_rng(0))
+    print(f'{features.shape[0]} beers, {features.shape[1]} features, {len(queries)} queries, k={args.k}')
+
+    start = time.perf_counter()
+    results = [brute_force(features, query, args.k) for query in queries]
+    latency = (time.perf_counter() - start) / len(queries)
+    hits = np.mean([recall(features, query, found, args.k) for query, found in zip(queries, results)])
+    print(f'{"brute force":>12}: {latency * 1e3:.3f} ms/query, recall {hits:.3f}')
+
+    for name in SEARCH_BACKENDS:
+        start = time.perf_counter()
+        search = build_search(name, features)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [search.search(query, args.k) for query in queries]
+        latency = (time.perf_counter() - start) / len(queries)
+        hits = np.mean([recall(features, query, found, args.k) for query, found in zip(queries, results)])
+        print(f'{name:>12}: {latency * 1e3:.3f} ms/query, recall {hits:.3f}, build {build:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
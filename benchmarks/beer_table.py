@@ -0,0 +1,73 @@
+"""
+Build time of the beer feature table: row-wise featurize vs vectorized build.
+
+Run from the repository root: python -m benchmarks.beer_table --rows 100000
+"""
+import argparse
+import ast
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from beer.src.beer_embedding import BeerEmbedding
+
+
+def load_catalog(path: str, feature_space: dict, rows: int) -> pd.DataFrame:
+    data = pd.read_csv(path, index_col=0)
+    for key in feature_space.keys():
+        data[key] = data[key].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else None)
+
+    copies = -(-rows // len(data))
+    scaled = pd.concat([data.rename(index=lambda name: f'{name}-{i}') for i in range(copies)])
+    return scaled.iloc[:rows]
+
+
+def build_rowwise(model: BeerEmbedding, data: pd.DataFrame):
+    for key in model.feature_space.keys():
+        data[key] = data[key].apply(
+            lambda x: list(map(str.lower, x)) if x is not np.nan and x is not None else [])
+
+    features, images, names = [], [], []
+    for name, row in data.iterrows():
+        vec = model.featurize(row)
+        if vec.sum() > 15:
+            features.append(vec)
+            images.append(row['img'])
+            names.append(name.replace('-', ' '))
+
+    return np.vstack(features), names, images
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--catalog', default='beer/data/beer.csv')
+    parser.add_argument('--features', default='beer/data/beer_features.json')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    # Only the feature space is needed to build the table, so the NLP models are not loaded
+    model = BeerEmbedding.__new__(BeerEmbedding)
+    with open(args.features, 'r') as f:
+        model.feature_space = json.load(f)
+
+    data = load_catalog(args.catalog, model.feature_space, args.rows)
+
+    start = time.perf_counter()
+    expected = build_rowwise(model, data.copy())
+    rowwise = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = model._build_table(data.copy())
+    vectorized = time.perf_counter() - start
+
+    assert np.array_equal(expected[0], actual[0]) and expected[1:] == actual[1:]
+
+    print(f'{len(data)} rows, {actual[0].shape[0]} beers, {actual[0].shape[1]} features')
+    print(f'row-wise:   {rowwise:.2f}s')
+    print(f'vectorized: {vectorized:.2f}s ({rowwise / vectorized:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Throughput of the single dispatcher thread vs ChatDispatcher with many concurrent chats.
+
+Every update goes to a handler that blocks for --latency seconds, like a weather or cat fact lookup.
+Run from the repository root: python -m benchmarks.dispatcher_load --chats 200 --messages 5
+"""
+import argparse
+import threading
+import time
+import warnings
+from collections import defaultdict
+from queue import Queue
+
+from telegram import Bot, Update
+from telegram.ext import CallbackContext, Dispatcher, Filters, MessageHandler
+
+from dispatcher import ChatDispatcher
+
+
+def make_updates(bot: Bot, chats: int, messages: int):
+    updates = []
+    for i in range(messages):
+        for chat in range(chats):
+            update_id = i * chats + chat
+            updates.append(Update.de_json({
+                'update_id': update_id,
+                'message': {'message_id': i, 'date': 0, 'text': f'погода {i}',
+                            'chat': {'id': chat, 'type': 'private'}},
+            }, bot))
+    return updates
+
+
+def run(dispatcher: Dispatcher, updates, latency: float) -> float:
+    seen = defaultdict(list)
+    lock = threading.Lock()
+    done = threading.Semaphore(0)
+
+    def callback(update: Update, callback_context: CallbackContext):
+        time.sleep(latency)
+        with lock:
+            seen[update.effective_chat.id].append(update.message.message_id)
+        done.release()
+
+    dispatcher.add_handler(MessageHandler(Filters.text, callback))
+
+    start = time.perf_counter()
+    for update in updates:
+        dispatcher.process_update(update)
+    for _ in updates:
+        done.acquire()
+    elapsed = time.perf_counter() - start
+
+    assert all(ids == sorted(ids) for ids in seen.values()), 'updates of a chat were reordered'
+    return len(updates) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, nargs='+', default=[8, 32, 64])
+    args = parser.parse_args()
+
+    # run_async is not used, so the dispatchers get no async workers (creating them would call getMe)
+    warnings.filterwarnings('ignore', message='Asynchronous callbacks')
+
+    # The token is never sent anywhere, handlers do not call the Bot API
+    bot = Bot('123456:benchmark')
+    updates = make_updates(bot, args.chats, args.messages)
+    print(f'{len(updates)} updates from {args.chats} chats, {args.latency * 1e3:.0f} ms per handler')
+
+    throughput = run(Dispatcher(bot, Queue(), workers=0), updates, args.latency)
+    print(f'single dispatcher thread: {throughput:8.1f} updates/s')
+
+    for workers in args.workers:
+        dispatcher = ChatDispatcher(bot, Queue(), workers=0, chat_workers=workers)
+        throughput = run(dispatcher, updates, args.latency)
+        dispatcher.stop()
+        print(f'{workers:3d} chat workers:          {throughput:8.1f} updates/s')
+
+
+if __name__ == '__main__':
+    main()
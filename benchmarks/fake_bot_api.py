@@ -0,0 +1,165 @@
+"""
+Local stand-in for the Telegram Bot API that answers like the real one and records every call.
+
+Point the bot at it with TELEGRAM_API_URL=http://127.0.0.1:<port>/bot.
+Run from the repository root: python -m benchmarks.fake_bot_api --port 8081
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple
+from urllib.parse import parse_qsl
+
+
+class Call(NamedTuple):
+    time: float
+    method: str
+    chat_id: int
+    params: dict
+
+
+def parse_params(content_type: str, body: bytes) -> dict:
+    if content_type.startswith('application/json'):
+        return json.loads(body or b'{}')
+
+    if content_type.startswith('multipart/form-data'):
+        # Only plain fields are needed, uploaded files are skipped
+        fields = re.findall(rb'name="([^"]+)"\r\n\r\n(.*?)\r\n--', body, flags=re.S)
+        return {name.decode(): value.decode('utf8', errors='replace') for name, value in fields}
+
+    return dict(parse_qsl(body.decode()))
+
+
+class FakeBotApi:
+    """
+    Threaded HTTP server with the Bot API methods the bot uses
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.):
+        self.latency = latency
+        self.__calls = []
+        self.__replies = defaultdict(int)
+        self.__message_id = 0
+        self.__lock = threading.Condition()
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                params = parse_params(self.headers.get('Content-Type', ''), body)
+
+                response = json.dumps({'ok': True, 'result': api.handle(method, params)}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            do_GET = do_POST
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='fake-bot-api', daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}/bot'
+
+    @property
+    def calls(self) -> List[Call]:
+        with self.__lock:
+            return list(self.__calls)
+
+    def replies(self, chat_id: int) -> int:
+        with self.__lock:
+            return self.__replies[chat_id]
+
+    def __message(self, chat_id: int, **fields) -> dict:
+        self.__message_id += 1
+        message = {'message_id': self.__message_id, 'date': int(time.time()),
+                   'chat': {'id': chat_id, 'type': 'private'}}
+        message.update(fields)
+        return message
+
+    def handle(self, method: str, params: dict):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        if method in ('setWebhook', 'deleteWebhook'):
+            return True
+        if method == 'getUpdates':
+            return []
+
+        chat_id = int(params.get('chat_id', 0))
+        with self.__lock:
+            if method == 'sendMessage':
+                result = self.__message(chat_id, text=params.get('text', ''))
+            elif method == 'sendMediaGroup':
+                media = params.get('media', [])
+                media = json.loads(media) if isinstance(media, str) else media
+                result = [
+                    self.__message(chat_id, photo=[{'file_id': f'photo-{self.__message_id}-{i}',
+                                                     'file_unique_id': f'{self.__message_id}-{i}',
+                                                     'width': 1, 'height': 1}])
+                    for i in range(len(media))
+                ]
+            else:
+                result = self.__message(chat_id)
+
+            self.__calls.append(Call(time.perf_counter(), method, chat_id, params))
+            self.__replies[chat_id] += 1
+            self.__lock.notify_all()
+
+        return result
+
+    def wait_for_replies(self, expected: Dict[int, int], timeout: float = None) -> bool:
+        """
+        Waits until every chat got at least the expected number of calls
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self.__lock:
+            while any(self.__replies[chat_id] < count for chat_id, count in expected.items()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.__lock.wait(remaining)
+
+        return True
+
+    def start(self) -> 'FakeBotApi':
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.)
+    args = parser.parse_args()
+
+    api = FakeBotApi(port=args.port, latency=args.latency).start()
+    print(f'Fake Bot API on {api.url}')
+    try:
+        while True:
+            time.sleep(60)
+            print(f'{len(api.calls)} calls')
+    except KeyboardInterrupt:
+        api.stop()
@@ -0,0 +1,53 @@
+"""
+Messages per second of per-handler trigger scans vs IntentRouter.
+
+Run from the repository root: python -m benchmarks.intent_router
+"""
+import argparse
+import random
+import time
+
+from intent_router import IntentRouter
+from text_handlers import HelloTextHandler, WeatherTextHandler, CatTextHandler, BeerTextHandler, EndTextHandler
+
+
+VOCABULARY = ['я', 'хотеть', 'узнать', 'какой', 'погода', 'в', 'москва', 'завтра', 'который', 'час',
+              'привет', 'пиво', 'светлый', 'тёмный', 'кот', 'рассказать', 'факт', 'пока', 'показать',
+              'неделя', 'температура', 'пивной', 'бар', 'ещё', 'здравствовать', 'и', 'а', 'спасибо']
+
+
+def scan(handlers, tokens):
+    joined_tokens = ' '.join(tokens)
+    return [handler for handler in handlers if any(word in joined_tokens for word in handler.triggers)]
+
+
+def measure(function, messages) -> float:
+    start = time.perf_counter()
+    for tokens in messages:
+        function(tokens)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--length', type=int, default=8)
+    args = parser.parse_args()
+
+    # Triggers are static properties, so the handlers are created without loading their models
+    handlers = [cls.__new__(cls) for cls in
+                [HelloTextHandler, WeatherTextHandler, CatTextHandler, BeerTextHandler, EndTextHandler]]
+    router = IntentRouter(handlers)
+
+    random.seed(0)
+    messages = [random.choices(VOCABULARY, k=random.randint(1, args.length)) for _ in range(args.messages)]
+
+    before = measure(lambda tokens: scan(handlers, tokens), messages)
+    after = measure(router.route, messages)
+
+    print(f'per-handler scan: {before:,.0f} messages/s')
+    print(f'intent router:    {after:,.0f} messages/s ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
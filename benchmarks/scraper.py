@@ -0,0 +1,45 @@
+"""
+Beer scraper against a local catalog server with a fixed response latency.
+
+Scrapes the whole catalog, then runs again from the checkpoint, which should fetch only the listing pages.
+Run from the repository root: python -m benchmarks.scraper --products 200 --latency 0.05 --workers 8
+"""
+import argparse
+import tempfile
+import time
+
+from beer.src.scraper import BeerScraper
+from tests.catalog_server import CatalogServer
+
+
+def run(catalog: CatalogServer, path: str, workers: int, rps: float):
+    start, requests = time.perf_counter(), catalog.requests
+    data = BeerScraper(path, base_url=catalog.url, workers=workers, requests_per_second=rps).parse()
+    return len(data), time.perf_counter() - start, catalog.requests - requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rps', type=float, default=1000.)
+    args = parser.parse_args()
+
+    catalog = CatalogServer(args.products, args.latency).start()
+
+    with tempfile.TemporaryDirectory() as path:
+        for name, workers in [('sequential', 1), (f'{args.workers} workers', args.workers)]:
+            with tempfile.TemporaryDirectory() as run_path:
+                products, seconds, requests = run(catalog, run_path, workers, args.rps)
+                print(f'{name}: {products} products in {seconds:.2f}s, {requests} requests')
+
+        run(catalog, path, args.workers, args.rps)
+        products, seconds, requests = run(catalog, path, args.workers, args.rps)
+        print(f'resumed: {products} products in {seconds:.2f}s, {requests} requests')
+
+    catalog.stop()
+
+
+if __name__ == '__main__':
+    main()
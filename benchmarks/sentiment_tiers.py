@@ -0,0 +1,113 @@
+"""
+Share of messages that reach the heavy sentiment model and per-message latency, single tier vs tiered.
+
+The heavy tier is a stand-in with a fixed batch latency, the cheap tier is distilled from its labels.
+With --data "label<TAB>text" lines a real corpus is used instead of generated messages,
+labelled by the stand-in's keyword rule unless --real-bert is given.
+Run from the repository root: python -m benchmarks.sentiment_tiers --messages 2000 --heavy-latency 0.15
+"""
+import argparse
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from sentiment import HashedLinearSentiment, SentimentService, TieredSentiment, build_rusentiment
+
+NEGATIVE = ['дурак', 'ненавижу', 'отстой', 'ужасный', 'тупой', 'бесит', 'мерзкий']
+POSITIVE = ['спасибо', 'люблю', 'отличный', 'классный', 'супер', 'нравится']
+NEUTRAL = ['пиво', 'погода', 'москва', 'завтра', 'кот', 'бот', 'сегодня', 'какой', 'где', 'светлый', 'темный',
+           'хочу', 'расскажи', 'неделя', 'город', 'факт', 'вечер', 'друг']
+
+HEAVY_LATENCY = 0.15
+
+
+def keyword_label(text: str) -> str:
+    words = set(text.lower().split())
+    if words & set(NEGATIVE):
+        return 'negative'
+    if words & set(POSITIVE):
+        return 'positive'
+    return 'neutral'
+
+
+def simulated_bert(latency: float = HEAVY_LATENCY):
+    def model(texts):
+        time.sleep(latency)
+        return [keyword_label(text) for text in texts]
+    return model
+
+
+def make_messages(count: int, seed: int):
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = rng.choices(NEUTRAL, k=rng.randint(2, 7))
+        kind = rng.random()
+        if kind < 0.15:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(NEGATIVE))
+        elif kind < 0.3:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(POSITIVE))
+        messages.append(' '.join(words))
+    return messages
+
+
+def run(model, messages, concurrency: int):
+    latencies = np.zeros(len(messages))
+
+    def classify(i):
+        start = time.perf_counter()
+        label = model.sentiment(messages[i])
+        latencies[i] = time.perf_counter() - start
+        return label
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        labels = list(executor.map(classify, range(len(messages))))
+    return labels, latencies * 1e3, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--train', type=int, default=3000)
+    parser.add_argument('--data', default=None)
+    parser.add_argument('--heavy-latency', type=float, default=HEAVY_LATENCY, help='seconds per heavy batch')
+    parser.add_argument('--threshold', type=float, default=0.9)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--real-bert', action='store_true')
+    args = parser.parse_args()
+
+    if args.data is not None:
+        with open(args.data, 'r', encoding='utf8') as f:
+            texts = [line.rstrip('\n').split('\t', 1)[1] for line in f if '\t' in line]
+        random.Random(0).shuffle(texts)
+        train, messages = texts[:args.train], texts[args.train:args.train + args.messages]
+    else:
+        train, messages = make_messages(args.train, seed=0), make_messages(args.messages, seed=1)
+
+    # The model factory runs in a spawned process, so the latency has to travel with it
+    model_factory = build_rusentiment if args.real_bert else functools.partial(simulated_bert, args.heavy_latency)
+    heavy = SentimentService(model_factory, cache_size=0)
+    start = time.perf_counter()
+    fast = HashedLinearSentiment.distill(train, heavy.predict)
+    print(f'distilled the cheap tier on {len(train)} messages in {time.perf_counter() - start:.1f}s')
+
+    expected, latencies, seconds = run(heavy, messages, args.concurrency)
+    print(f'heavy only: {len(messages) / seconds:.0f} msg/s, '
+          f'p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.1f} ms')
+
+    tiered = TieredSentiment(fast, heavy, threshold=args.threshold)
+    labels, latencies, seconds = run(tiered, messages, args.concurrency)
+    agreement = np.mean([a == b for a, b in zip(labels, expected)])
+    print(f'tiered: {len(messages) / seconds:.0f} msg/s, '
+          f'p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.1f} ms, '
+          f'heavy share {tiered.stats["heavy_share"]:.1%}, agreement with heavy {agreement:.1%}')
+
+    heavy.close()
+
+
+if __name__ == '__main__':
+    main()
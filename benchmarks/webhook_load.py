@@ -0,0 +1,108 @@
+"""
+End-to-end load test of the bot in webhook mode.
+
+Synthetic updates are posted to the bot's webhook and go through the real ConversationHandler,
+replies go to a local fake Bot API (benchmarks.fake_bot_api). Reports throughput and the latency
+from posting an update to the last reply it causes.
+Run from the repository root: python -m benchmarks.webhook_load --chats 500 --api-latency 0.05
+"""
+import argparse
+import os
+import socket
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+
+import numpy as np
+import requests
+
+from benchmarks.fake_bot_api import FakeBotApi
+
+# Every chat says these messages in order, with the number of replies each one gets
+SCRIPT = [('/start', 1), ('привет', 1), ('пока', 1)]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def make_update(update_id: int, chat_id: int, message_id: int, text: str) -> dict:
+    message = {'message_id': message_id, 'date': int(time.time()), 'text': text,
+               'chat': {'id': chat_id, 'type': 'private'},
+               'from': {'id': chat_id, 'is_bot': False, 'first_name': f'User {chat_id}'}}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--clients', type=int, default=40, help='concurrent webhook connections')
+    parser.add_argument('--chat-workers', type=int, default=8)
+    parser.add_argument('--api-latency', type=float, default=0.05, help='fake Bot API response time, seconds')
+    parser.add_argument('--global-rate', type=float, default=30., help='outgoing messages per second, BOT_GLOBAL_RATE')
+    parser.add_argument('--preload', action='store_true', help='preload all models like in production')
+    args = parser.parse_args()
+
+    api = FakeBotApi(latency=args.api_latency).start()
+    port = free_port()
+    os.environ.update({'TELEGRAM_TOKEN': '123456:' + 'A' * 35, 'TELEGRAM_API_URL': api.url,
+                       'WEBHOOK_LISTEN': '127.0.0.1', 'PORT': str(port), 'WEBHOOK_PATH': 'webhook',
+                       'WEBHOOK_URL': f'http://127.0.0.1:{port}',
+                       'BOT_GLOBAL_RATE': str(args.global_rate)})
+
+    from TelegramBot import TelegramBot
+    bot = TelegramBot(chat_workers=args.chat_workers, preload=args.preload)
+    bot.start_webhook()
+    time.sleep(0.5)
+
+    url = f'http://127.0.0.1:{port}/webhook'
+    updates = []
+    for step, (text, _) in enumerate(SCRIPT):
+        for chat_id in range(1, args.chats + 1):
+            updates.append((chat_id, step, make_update(len(updates) + 1, chat_id, step + 1, text)))
+
+    expected = list(accumulate(replies for _, replies in SCRIPT))
+    base_replies = {chat_id: api.replies(chat_id) for chat_id in range(1, args.chats + 1)}
+    sent = {}
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.clients))
+
+    def post(item):
+        chat_id, step, update = item
+        sent[chat_id, step] = time.perf_counter()
+        session.post(url, json=update, timeout=30).raise_for_status()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        list(executor.map(post, updates))
+
+    done = api.wait_for_replies({chat_id: base + expected[-1] for chat_id, base in base_replies.items()}, timeout=300)
+    seconds = time.perf_counter() - start
+
+    reply_times = defaultdict(list)
+    for call in api.calls:
+        reply_times[call.chat_id].append(call.time)
+
+    latencies = []
+    for (chat_id, step), sent_at in sent.items():
+        times = sorted(reply_times[chat_id])[base_replies[chat_id]:]
+        if len(times) >= expected[step]:
+            latencies.append(times[expected[step] - 1] - sent_at)
+
+    latencies = np.array(latencies) * 1e3
+    print(f'{"all" if done else "NOT all"} replies received: {len(updates)} updates, {len(api.calls)} API calls')
+    print(f'throughput: {len(updates) / seconds:.1f} updates/s')
+    print(f'latency: p50 {np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms, '
+          f'max {latencies.max():.1f} ms')
+
+    bot.updater.stop()
+    api.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with expiring entries.
+
+    Concurrent misses of one key are collapsed into a single load,
+    the other callers wait for its result. None results are not stored.
+    """
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.__ttl = ttl
+        self.__max_size = max_size
+        self.__items = OrderedDict()
+        self.__loading = {}
+        self.__lock = threading.Lock()
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__coalesced = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {'hits': self.__hits, 'misses': self.__misses, 'coalesced': self.__coalesced,
+                    'size': len(self.__items)}
+
+    def get_or_load(self, key: Hashable, loader: Callable):
+        with self.__lock:
+            item = self.__items.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self.__hits += 1
+                self.__items.move_to_end(key)
+                return item[1]
+
+            future = self.__loading.get(key)
+            owner = future is None
+            if owner:
+                self.__misses += 1
+                future = self.__loading[key] = Future()
+            else:
+                self.__coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self.__lock:
+                del self.__loading[key]
+            future.set_exception(e)
+            raise
+
+        with self.__lock:
+            del self.__loading[key]
+            if value is not None:
+                self.__items[key] = (time.monotonic() + self.__ttl, value)
+                self.__items.move_to_end(key)
+                while len(self.__items) > self.__max_size:
+                    self.__items.popitem(last=False)
+
+        future.set_result(value)
+        return value
+
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache, `get` returns MISSING for absent keys so None can be cached
+    """
+    def __init__(self, max_size: int = 10000):
+        self.__max_size = max_size
+        self.__items = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__items)
+
+    def get(self, key: Hashable, default=MISSING):
+        with self.__lock:
+            if key not in self.__items:
+                return default
+
+            self.__items.move_to_end(key)
+            return self.__items[key]
+
+    def put(self, key: Hashable, value):
+        with self.__lock:
+            self.__items[key] = value
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.__max_size:
+                self.__items.popitem(last=False)
@@ -0,0 +1,210 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable, List
+
+
+class Defer(Exception):
+    """
+    Raised by a KeyedExecutor task to run it again in `delay` seconds, without holding a worker meanwhile.
+    Later tasks with the same key wait for it.
+    """
+    def __init__(self, delay: float):
+        super().__init__(delay)
+        self.delay = delay
+
+
+class KeyedExecutor:
+    """
+    Bounded thread pool where tasks with the same key run one at a time, in submission order
+    """
+    def __init__(self, max_workers: int, thread_name_prefix: str = 'keyed'):
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.__thread_name_prefix = thread_name_prefix
+        self.__lock = threading.Lock()
+        # A key is present while one of its tasks is scheduled, deferred or running
+        self.__queues = {}
+        self.__scheduler = None
+
+    @property
+    def pending(self) -> int:
+        with self.__lock:
+            return sum(len(tasks) for tasks in self.__queues.values())
+
+    def submit(self, key: Hashable, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+
+        with self.__lock:
+            tasks = self.__queues.get(key)
+            if tasks is None:
+                self.__queues[key] = deque([(fn, args, kwargs, future)])
+                self.__executor.submit(self.__run_next, key)
+            else:
+                tasks.append((fn, args, kwargs, future))
+
+        return future
+
+    def __defer(self, key: Hashable, delay: float):
+        with self.__lock:
+            if self.__scheduler is None:
+                self.__scheduler = Scheduler(name=f'{self.__thread_name_prefix}-scheduler')
+
+        self.__scheduler.call_later(delay, self.__executor.submit, self.__run_next, key)
+
+    def __run_next(self, key: Hashable):
+        with self.__lock:
+            fn, args, kwargs, future = self.__queues[key][0]
+
+        # A deferred task is already running
+        if future.running() or future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Defer as e:
+                return self.__defer(key, e.delay)
+            except BaseException as e:
+                future.set_exception(e)
+
+        with self.__lock:
+            tasks = self.__queues[key]
+            tasks.popleft()
+            if len(tasks) == 0:
+                del self.__queues[key]
+            else:
+                # Go to the back of the pool queue, so a busy key does not starve the others
+                self.__executor.submit(self.__run_next, key)
+
+    def shutdown(self, wait: bool = True):
+        self.__executor.shutdown(wait=wait)
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from many threads and processes them in batches.
+
+    A batch is flushed when it has `max_batch_size` items or `max_delay` seconds
+    after its first item arrived, whichever comes first.
+    """
+    def __init__(self, process_batch: Callable[[List], List], max_batch_size: int = 32,
+                 max_delay: float = 0.005, name: str = 'micro-batcher'):
+        self.__process_batch = process_batch
+        self.__max_batch_size = max_batch_size
+        self.__max_delay = max_delay
+        self.__queue = queue.Queue()
+
+        self.__worker = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__worker.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self.__queue.put((item, future))
+        return future
+
+    def __collect(self) -> List:
+        batch = [self.__queue.get()]
+        deadline = time.monotonic() + self.__max_delay
+
+        while len(batch) < self.__max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.__queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def __run(self):
+        while True:
+            batch = [(item, future) for item, future in self.__collect() if future.set_running_or_notify_cancel()]
+            if len(batch) == 0:
+                continue
+
+            try:
+                results = self.__process_batch([item for item, _ in batch])
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `burst` at once
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.__rate = rate
+        self.__burst = burst
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self, tokens: float) -> float:
+        """
+        Takes the tokens if there are enough and returns 0, otherwise returns how long to wait for them
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__burst, self.__tokens + (now - self.__updated) * self.__rate)
+            self.__updated = now
+
+            if self.__tokens >= tokens:
+                self.__tokens -= tokens
+                return 0.
+
+            return (tokens - self.__tokens) / self.__rate
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        return self.reserve(tokens) == 0.
+
+    def acquire(self, tokens: float = 1, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            wait = self.reserve(tokens)
+            if wait == 0.:
+                return True
+
+            if deadline is not None:
+                if time.monotonic() + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+
+class Scheduler:
+    """
+    Runs callbacks after a delay from one timer thread, callbacks must be quick, e.g. a submit to a pool
+    """
+    def __init__(self, name: str = 'scheduler'):
+        self.__logger = logging.getLogger(__file__)
+        self.__heap = []
+        self.__order = itertools.count()
+        self.__condition = threading.Condition()
+
+        self.__worker = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__worker.start()
+
+    def call_later(self, delay: float, fn: Callable, *args):
+        with self.__condition:
+            heapq.heappush(self.__heap, (time.monotonic() + delay, next(self.__order), fn, args))
+            self.__condition.notify()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while len(self.__heap) == 0 or self.__heap[0][0] > time.monotonic():
+                    self.__condition.wait(self.__heap[0][0] - time.monotonic() if len(self.__heap) > 0 else None)
+                _, _, fn, args = heapq.heappop(self.__heap)
+
+            try:
+                fn(*args)
+            except Exception as e:
+                self.__logger.error(f'Scheduled callback failed: {e!r}')
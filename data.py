@@ -1,21 +1,48 @@
+import hashlib
+import json
+import logging
 import os
-import requests
+import os.path as osp
+import shutil
+import tempfile
 import zipfile
+from typing import BinaryIO, Optional, Union
+
+import requests
+
+from http_client import get_http_client
+
+DATA_DIR = 'beer'
+MANIFEST_PATH = osp.join(DATA_DIR, '.data_manifest.json')
+CHUNK_SIZE = 32768
 
+logger = logging.getLogger(__file__)
 
-def download_file_from_google_drive(id_, destination):
+
+def download_file_from_google_drive(id_, destination, etag=None):
+    """
+    Streams the file into `destination` and returns (ETag, sha256),
+    (ETag, None) if the server says the file with `etag` has not changed
+    """
     URL = "https://docs.google.com/uc?export=download"
 
-    session = requests.Session()
+    client = get_http_client()
+    headers = {'If-None-Match': etag} if etag else {}
 
-    response = session.get(URL, params={'id': id_}, stream=True)
+    response = client.get(URL, params={'id': id_}, headers=headers, stream=True)
     token = get_confirm_token(response)
 
     if token:
         params = {'id': id_, 'confirm': token}
-        response = session.get(URL, params=params, stream=True)
+        response.close()
+        response = client.get(URL, params=params, headers=headers, stream=True)
+
+    with response:
+        if response.status_code == 304:
+            return etag, None
 
-    save_response_content(response, destination)
+        response.raise_for_status()
+        return response.headers.get('ETag'), save_response_content(response, destination)
 
 
 def get_confirm_token(response):
@@ -26,24 +53,153 @@ def get_confirm_token(response):
     return None
 
 
-def save_response_content(response, destination):
-    CHUNK_SIZE = 32768
+def save_response_content(response, destination: BinaryIO) -> str:
+    sha256 = hashlib.sha256()
 
-    with open(destination, "wb") as f:
-        for chunk in response.iter_content(CHUNK_SIZE):
-            if chunk:  # filter out keep-alive new chunks
-                f.write(chunk)
+    for chunk in response.iter_content(CHUNK_SIZE):
+        if chunk:  # filter out keep-alive new chunks
+            destination.write(chunk)
+            sha256.update(chunk)
 
+    return sha256.hexdigest()
 
-def get_data():
-    id_ = os.environ.get('GDRIVE_DATA_ID')
 
-    if id_ is None:
-        raise ValueError('"GDRIVE_DATA_ID" environment variable is not set!')
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def load_manifest() -> Optional[dict]:
+    try:
+        with open(MANIFEST_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(manifest: dict):
+    tmp_path = f'{MANIFEST_PATH}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def is_extracted(manifest: Optional[dict]) -> bool:
+    """
+    Every file from the manifest is on disk with the recorded size
+    """
+    if manifest is None:
+        return False
 
-    download_file_from_google_drive(id_, 'beer_data.zip')
+    return all(
+        osp.isfile(osp.join(DATA_DIR, name)) and osp.getsize(osp.join(DATA_DIR, name)) == item['size']
+        for name, item in manifest['files'].items()
+    )
 
-    with zipfile.ZipFile('beer_data.zip', 'r') as zip_:
-        zip_.extractall('beer')
 
-    os.remove('beer_data.zip')
+def extract(archive: Union[str, BinaryIO], manifest: Optional[dict]) -> dict:
+    """
+    Extracts the archive into DATA_DIR, skipping files the previous manifest says are already there.
+    zipfile checks the CRC of every extracted file.
+    """
+    old_files = manifest['files'] if manifest is not None else {}
+    files = {}
+
+    with zipfile.ZipFile(archive, 'r') as zip_:
+        for info in zip_.infolist():
+            if info.is_dir():
+                continue
+
+            name = osp.normpath(info.filename)
+            if osp.isabs(name) or name.startswith('..'):
+                raise ValueError(f'Unsafe path in the data archive: {info.filename}')
+
+            files[name] = {'size': info.file_size, 'crc': info.CRC}
+            path = osp.join(DATA_DIR, name)
+
+            old = old_files.get(name)
+            if old == files[name] and osp.isfile(path) and osp.getsize(path) == info.file_size:
+                continue
+
+            os.makedirs(osp.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with zip_.open(info) as src, open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+
+    return files
+
+
+def check_sha256(sha256: str, expected: Optional[str]):
+    if expected is not None and sha256 != expected.lower():
+        raise ValueError(f'Beer data checksum mismatch: expected {expected}, got {sha256}')
+
+
+def get_data(archive: str = None, refresh: bool = None):
+    """
+    Makes sure the beer data is extracted and current.
+
+    The data comes from a local zip (`archive` or BEER_DATA_ARCHIVE) or from Google Drive (GDRIVE_DATA_ID).
+    Nothing is extracted when the archive matches the manifest of the last extraction,
+    and the local data is used as is when Google Drive is unreachable.
+    If GDRIVE_DATA_SHA256 is set, the archive must have this checksum.
+    Without an ETag from Google Drive there is no cheap way to see a change, so the data from Drive
+    is downloaded again only if `refresh` or BEER_DATA_REFRESH=1 asks for it.
+    """
+    archive = archive or os.environ.get('BEER_DATA_ARCHIVE')
+    id_ = os.environ.get('GDRIVE_DATA_ID')
+    expected_sha256 = os.environ.get('GDRIVE_DATA_SHA256')
+    if refresh is None:
+        refresh = os.environ.get('BEER_DATA_REFRESH', '0') == '1'
+
+    manifest = load_manifest()
+    extracted = is_extracted(manifest)
+
+    if archive is None and id_ is None:
+        if extracted:
+            return
+        raise ValueError('"GDRIVE_DATA_ID" environment variable is not set!')
+
+    if archive is not None:
+        source, etag, size = osp.abspath(archive), None, osp.getsize(archive)
+        sha256 = hash_file(archive)
+        check_sha256(sha256, expected_sha256)
+
+        files = manifest['files'] if extracted and manifest.get('sha256') == sha256 else \
+            extract(archive, manifest)
+    else:
+        source = f'gdrive:{id_}'
+        current = extracted and manifest.get('source') == source and \
+            (expected_sha256 is None or manifest.get('sha256') == expected_sha256.lower())
+        old_etag = manifest.get('etag') if current else None
+
+        if current and old_etag is None and not refresh:
+            return
+
+        # A real file: zipfile needs seekable(), which SpooledTemporaryFile lacks before Python 3.11
+        with tempfile.TemporaryFile() as f:
+            try:
+                etag, sha256 = download_file_from_google_drive(id_, f, old_etag)
+            except requests.RequestException as e:
+                if extracted:
+                    logger.warning(f"Can't download the beer data, using the local copy: {e}")
+                    return
+                raise
+
+            if sha256 is None:
+                return
+
+            check_sha256(sha256, expected_sha256)
+            size = f.tell()
+            if extracted and manifest.get('sha256') == sha256:
+                files = manifest['files']
+            else:
+                f.seek(0)
+                files = extract(f, manifest)
+
+    save_manifest({'source': source, 'sha256': sha256, 'etag': etag, 'size': size, 'files': files})
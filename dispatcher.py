@@ -0,0 +1,28 @@
+from telegram import Update
+from telegram.ext import Dispatcher
+
+from concurrency import KeyedExecutor
+
+
+class ChatDispatcher(Dispatcher):
+    """
+    Dispatcher that processes updates of different chats concurrently on a bounded pool.
+
+    Updates of one chat are still processed one at a time and in order,
+    so conversation states stay consistent.
+    """
+    def __init__(self, *args, chat_workers: int = 8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__chat_executor = KeyedExecutor(chat_workers, thread_name_prefix='chat')
+
+    def process_update(self, update: object) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+
+        if chat is None:
+            super().process_update(update)
+        else:
+            self.__chat_executor.submit(chat.id, super().process_update, update)
+
+    def stop(self) -> None:
+        super().stop()
+        self.__chat_executor.shutdown()
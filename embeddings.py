@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import os.path as osp
+import shutil
+
+import numpy as np
+from navec import Navec
+from navec.meta import Meta
+from navec.pq import PQ
+from navec.vocab import Vocab
+
+NAVEC_PATH = 'weights/navec_news_v1_1B_250K_300d_100q.tar'
+NAVEC_MMAP_DIR = 'cache/navec'
+# Bump when the layout of the extracted directory changes
+MMAP_VERSION = 1
+
+
+class MappedPQ(PQ):
+    """
+    Navec product quantization over memory-mapped arrays.
+
+    The norms and centroid products that PQ computes on load are read from disk,
+    so a process only pages in the rows it looks up and shares them with other processes.
+    """
+    def __init__(self, vectors, dim, qdim, centroids, indexes, codes, norm, ab):
+        self.norm = norm
+        self.ab = ab
+        super().__init__(vectors, dim, qdim, centroids, indexes, codes)
+
+    def precompute(self):
+        self.qdims = np.arange(self.qdim)
+
+
+def _source_stamp(path: str) -> dict:
+    stat = os.stat(path)
+    return {'version': MMAP_VERSION, 'source': osp.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _read_stamp(mmap_dir: str):
+    try:
+        with open(osp.join(mmap_dir, 'meta.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def extract_navec(path: str = NAVEC_PATH, mmap_dir: str = NAVEC_MMAP_DIR) -> str:
+    """
+    Unpacks a Navec tar into a directory of flat .npy arrays that can be memory-mapped
+    """
+    navec = Navec.load(path)
+    pq = navec.pq
+
+    tmp_dir = f'{mmap_dir}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    np.save(osp.join(tmp_dir, 'indexes.npy'), np.ascontiguousarray(pq.indexes, dtype=np.uint8))
+    np.save(osp.join(tmp_dir, 'codes.npy'), np.ascontiguousarray(pq.codes, dtype=np.float32))
+    np.save(osp.join(tmp_dir, 'norm.npy'), pq.norm.astype(np.float32))
+    np.save(osp.join(tmp_dir, 'ab.npy'), pq.ab.astype(np.float32))
+    np.save(osp.join(tmp_dir, 'counts.npy'), np.asarray(navec.vocab.counts, dtype=np.uint32))
+    with open(osp.join(tmp_dir, 'words.txt'), 'w', encoding='utf8') as f:
+        f.write('\n'.join(navec.vocab.words))
+
+    stamp = _source_stamp(path)
+    stamp.update({'meta': navec.meta.as_json, 'vectors': int(pq.vectors), 'dim': int(pq.dim),
+                  'qdim': int(pq.qdim), 'centroids': int(pq.centroids)})
+    # meta.json is written last, a directory without it is never loaded
+    with open(osp.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(stamp, f, indent=2)
+
+    shutil.rmtree(mmap_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, mmap_dir)
+    except OSError:
+        # Another process has extracted it first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return mmap_dir
+
+
+def load_navec(path: str = NAVEC_PATH, mmap_dir: str = None) -> Navec:
+    """
+    Navec with memory-mapped tables, extracted from the tar on first use or when the tar changes
+    """
+    if mmap_dir is None:
+        mmap_dir = os.environ.get('NAVEC_MMAP_DIR', NAVEC_MMAP_DIR)
+
+    stamp = _read_stamp(mmap_dir)
+    if stamp is None or (osp.exists(path) and
+                         {k: stamp.get(k) for k in ('version', 'source', 'size', 'mtime')} != _source_stamp(path)):
+        extract_navec(path, mmap_dir)
+        stamp = _read_stamp(mmap_dir)
+
+    def load(name):
+        return np.load(osp.join(mmap_dir, name), mmap_mode='r')
+
+    with open(osp.join(mmap_dir, 'words.txt'), 'r', encoding='utf8') as f:
+        words = f.read().split('\n')
+
+    pq = MappedPQ(stamp['vectors'], stamp['dim'], stamp['qdim'], stamp['centroids'],
+                  load('indexes.npy'), load('codes.npy'), load('norm.npy'), load('ab.npy'))
+    return Navec(Meta.from_json(stamp['meta']), Vocab(words, load('counts.npy')), pq)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract Navec embeddings for memory-mapped loading')
+    parser.add_argument('--path', default=NAVEC_PATH)
+    parser.add_argument('--out', default=os.environ.get('NAVEC_MMAP_DIR', NAVEC_MMAP_DIR))
+    args = parser.parse_args()
+
+    print(f'Extracted {args.path} to {extract_navec(args.path, args.out)}')
@@ -1,18 +1,137 @@
+import argparse
+import logging
+import queue
+import random
+import threading
+import time
+from typing import List
+
 import requests
+from http_client import get_http_client
+from features.translation_cache import TranslationCache
 from googletrans import Translator
 from httpcore._exceptions import ConnectError
 
 
 class CatFactGenerator:
+    """
+    Cat facts in Russian, served from a buffer that a background worker refills in batches
+    """
     __url__ = 'https://catfact.ninja/fact'
+    __batch_url__ = 'https://catfact.ninja/facts'
     __translator__ = Translator()
+    __errors__ = (ConnectError, requests.RequestException, ValueError, KeyError, AttributeError, TypeError)
+
+    def __init__(self, buffer_size: int = 50, batch_size: int = 10, retry_interval: float = 30., prefetch: bool = True):
+        self.__logger = logging.getLogger(__file__)
+        self.__fallback_message = 'Факты про кошек кончились :('
+        self.__buffer = queue.Queue(maxsize=buffer_size)
+        self.__batch_size = min(batch_size, buffer_size)
+        self.__retry_interval = retry_interval
+        self.__last_page = 1
+        self.__wakeup = threading.Event()
+        # Set while the refill worker can't get facts, so sample() does not wait for a dead upstream too
+        self.__upstream_failing = threading.Event()
+        self.__translations = TranslationCache()
+
+        if prefetch:
+            self.__worker = threading.Thread(target=self.__refill, name='cat-facts', daemon=True)
+            self.__worker.start()
+
+    def __translate(self, facts: List[str]) -> List[str]:
+        translations = self.__translations.get_many(facts, 'ru')
+        missing = list(dict.fromkeys(fact for fact in facts if fact not in translations))
+
+        if len(missing) > 0:
+            translated = {fact: x.text for fact, x in zip(missing, self.__translator__.translate(missing, dest='ru'))}
+            self.__translations.put_many(translated, 'ru')
+            translations.update(translated)
+
+        return [translations[fact] for fact in facts]
+
+    def __fetch_batch(self) -> List[str]:
+        params = {'limit': self.__batch_size, 'page': random.randint(1, self.__last_page)}
+        page = get_http_client().get(self.__batch_url__, params=params).json()
+        self.__last_page = int(page.get('last_page', self.__last_page))
+
+        facts = [x['fact'] for x in page['data']]
+        random.shuffle(facts)
+        return self.__translate(facts) if len(facts) > 0 else []
+
+    def __refill(self):
+        while True:
+            if self.__buffer.maxsize - self.__buffer.qsize() < self.__batch_size:
+                self.__wakeup.wait()
+                self.__wakeup.clear()
+                continue
+
+            try:
+                facts = self.__fetch_batch()
+            except self.__errors__ as e:
+                self.__logger.warning(f"Can't refill cat facts: {e}")
+                self.__upstream_failing.set()
+                facts = []
+            except Exception as e:
+                # Anything else would silently end the worker and leave the buffer empty for good
+                self.__logger.exception(f"Unexpected error while refilling cat facts: {e!r}")
+                self.__upstream_failing.set()
+                facts = []
+            else:
+                self.__upstream_failing.clear()
+
+            if len(facts) == 0:
+                time.sleep(self.__retry_interval)
+                continue
+
+            for fact in facts:
+                try:
+                    self.__buffer.put_nowait(fact)
+                except queue.Full:
+                    break
+
+    def __fetch_one(self) -> str:
+        req = get_http_client().get(self.__url__)
+
+        fact = req.json()['fact']
+        return self.__translate([fact])[0]
 
     def sample(self):
         try:
-            req = requests.get(self.__url__)
+            fact = self.__buffer.get_nowait()
+        except queue.Empty:
+            if self.__upstream_failing.is_set():
+                fact = self.__fallback_message
+            else:
+                try:
+                    fact = self.__fetch_one()
+                except self.__errors__:
+                    fact = self.__fallback_message
 
-            fact = req.json()['fact']
-            fact = self.__translator__.translate(fact, dest='ru').text
-        except (ConnectError, requests.ConnectionError):
-            fact = 'Факты про кошек кончились :('
+        self.__wakeup.set()
         return fact
+
+    def warm_up(self, page_size: int = 100) -> int:
+        """
+        Fetches the whole catfact.ninja corpus and translates every fact that is not cached yet
+        """
+        page, last_page, total = 1, 1, 0
+        while page <= last_page:
+            response = get_http_client().get(self.__batch_url__, params={'limit': page_size, 'page': page}).json()
+            last_page = int(response.get('last_page', page))
+
+            facts = [x['fact'] for x in response['data']]
+            self.__translate(facts)
+            total += len(facts)
+            page += 1
+
+        return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cat facts tools')
+    parser.add_argument('command', choices=['warmup'])
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == 'warmup':
+        print(f'Translated cat facts corpus: {CatFactGenerator(prefetch=False).warm_up(args.page_size)} facts')
@@ -0,0 +1,70 @@
+import csv
+import os
+import os.path as osp
+import pathlib
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+
+SEED_PATH = osp.join(pathlib.Path(__file__).parent, 'data/cities.csv')
+
+
+def normalize_city(city_name: str) -> str:
+    return city_name.strip().lower().replace('ё', 'е')
+
+
+class Gazetteer:
+    """
+    Persistent city -> (lat, lon) table.
+
+    Pre-populated from a seed file and filled lazily from geocoding responses.
+    Names the geocoder did not find are stored too, so they are rejected without a request.
+    """
+    def __init__(self, path: str = 'cache/gazetteer.sqlite3', seed_path: str = SEED_PATH, strict: bool = False):
+        if osp.dirname(path):
+            os.makedirs(osp.dirname(path), exist_ok=True)
+
+        self.__strict = strict
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                'CREATE TABLE IF NOT EXISTS cities (name TEXT PRIMARY KEY, lat REAL, lon REAL)'
+            )
+
+        if seed_path is not None:
+            self.__seed(seed_path)
+
+    def __seed(self, seed_path: str):
+        with open(seed_path, 'r', encoding='utf-8') as f:
+            rows = [(normalize_city(row['name']), float(row['lat']), float(row['lon'])) for row in csv.DictReader(f)]
+
+        with self.__lock, self.__connection:
+            self.__connection.executemany('INSERT OR IGNORE INTO cities (name, lat, lon) VALUES (?, ?, ?)', rows)
+
+    def lookup(self, city_name: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """
+        Returns (known, coord): coord is None for names known to be missing.
+        In strict mode every name that is not in the table is known to be missing.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                'SELECT lat, lon FROM cities WHERE name = ?', (normalize_city(city_name),)
+            ).fetchone()
+
+        if row is None:
+            return self.__strict, None
+        if row[0] is None:
+            return True, None
+
+        return True, (row[0], row[1])
+
+    def add(self, city_name: str, coord: Optional[Tuple[float, float]]):
+        lat, lon = coord if coord is not None else (None, None)
+
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                'INSERT OR REPLACE INTO cities (name, lat, lon) VALUES (?, ?, ?)', (normalize_city(city_name), lat, lon)
+            )
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import os.path as osp
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+
+class TranslationCache:
+    """
+    Persistent content-addressed translation cache: hash of the source text -> translation.
+
+    Holds at most `max_entries` translations, the least recently used ones are evicted first.
+    """
+    def __init__(self, path: str = 'cache/translations.sqlite3', max_entries: int = 10000):
+        if osp.dirname(path):
+            os.makedirs(osp.dirname(path), exist_ok=True)
+
+        self.__max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                'CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, text TEXT NOT NULL, used REAL NOT NULL)'
+            )
+            self.__connection.execute('CREATE INDEX IF NOT EXISTS translations_used ON translations (used)')
+
+    @staticmethod
+    def key(text: str, dest: str) -> str:
+        return hashlib.sha256(f'{dest}\n{text}'.encode()).hexdigest()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__connection.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+
+    def get_many(self, texts: List[str], dest: str) -> Dict[str, str]:
+        keys = {self.key(text, dest): text for text in texts}
+        if len(keys) == 0:
+            return {}
+
+        with self.__lock, self.__connection:
+            placeholders = ', '.join('?' * len(keys))
+            rows = self.__connection.execute(
+                f'SELECT key, text FROM translations WHERE key IN ({placeholders})', list(keys)
+            ).fetchall()
+            self.__connection.executemany(
+                'UPDATE translations SET used = ? WHERE key = ?', [(time.time(), key) for key, _ in rows]
+            )
+
+        return {keys[key]: translation for key, translation in rows}
+
+    def put_many(self, translations: Dict[str, str], dest: str):
+        now = time.time()
+
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO translations (key, text, used) VALUES (?, ?, ?)',
+                [(self.key(text, dest), translation, now) for text, translation in translations.items()]
+            )
+            self.__connection.execute(
+                'DELETE FROM translations WHERE key IN '
+                '(SELECT key FROM translations ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.__max_entries,)
+            )
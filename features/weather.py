@@ -1,20 +1,32 @@
 import os
-from navec import Navec
-from slovnet import NER
-import pymorphy2
 import requests
-from typing import List
+from http_client import get_http_client
+from lemmatizer import get_lemmatizer
+from cache import LRUCache, MISSING, TTLCache
+from concurrency import MicroBatcher
+from models import registry
+from features.gazetteer import Gazetteer, normalize_city
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 
 class Weather:
-    def __init__(self):
-        self.__navec = Navec.load('weights/navec_news_v1_1B_250K_300d_100q.tar')
-        self.__ner = NER.load('weights/slovnet_ner_news_v1.tar')
-        self.__ner.navec(self.__navec)
-        self._morph = pymorphy2.MorphAnalyzer()
+    def __init__(self, ner_batch_size: int = 32, ner_batch_delay: float = None):
+        if ner_batch_delay is None:
+            ner_batch_delay = float(os.environ.get('WEATHER_NER_BATCH_DELAY', 0.005))
+
+        self.__cities = LRUCache()
+        self.__ner_batcher = MicroBatcher(self.__recognize_cities, max_batch_size=ner_batch_size,
+                                          max_delay=ner_batch_delay, name='weather-ner')
+        self._lemmatizer = get_lemmatizer()
         self.__default_city = 'Москва'
         self.__unknown_message = 'Извини, но я не нашел такого города.'
+        self.__error_message = 'Не получилось узнать погоду, попробуй чуть позже.'
+        self.__http = get_http_client()
+
+        self.__coords = TTLCache(ttl=float(os.environ.get('WEATHER_COORD_TTL', 30 * 24 * 60 * 60)))
+        self.__forecasts = TTLCache(ttl=float(os.environ.get('WEATHER_FORECAST_TTL', 10 * 60)))
+        self.__gazetteer = Gazetteer(strict=os.environ.get('WEATHER_GAZETTEER_STRICT', '0') == '1')
 
         self.__translate = {
             'Clear': 'Ясно☀️',
@@ -26,40 +38,60 @@ class Weather:
             'Drizzle': 'Изморось🌧️',
         }
 
-    def __lemmatize(self, text):
-        words = text.split()
-        res = list()
-        for word in words:
-            p = self._morph.parse(word)[0]
-            res.append(p.normal_form)
-
-        return res
+    def __lemmatize(self, text) -> List[str]:
+        return self._lemmatizer.lemmatize(text)
 
     def __upper_message(self, message_list: List[str]) -> List[str]:
         return [x.capitalize() for x in message_list]
 
-    def __get_city(self, message):
-        lemmatized_upper_message = self.__upper_message(self.__lemmatize(message))
-        markup = self.__ner(' '.join(lemmatized_upper_message))
+    def __ner_text(self, tokens: List[str]) -> str:
+        return ' '.join(self.__upper_message(tokens))
 
-        spans = [x for x in markup.spans if x.type == 'LOC']
+    def __recognize_cities(self, texts: List[str]) -> List[Optional[str]]:
+        cities = []
 
-        if len(spans) > 0:
-            city = message[:spans[0].stop].strip().split(' ')[-1]
-            city = ' '.join(self.__upper_message(self.__lemmatize(city)))
+        for text, markup in zip(texts, registry.get('ner').map(texts)):
+            spans = [x for x in markup.spans if x.type == 'LOC']
+            # The NER input is already lemmatized and capitalized, so the last word of the span is the city
+            city = text[spans[0].start:spans[0].stop].split()[-1] if len(spans) > 0 else None
 
-            return city
+            self.__cities.put(text, city)
+            cities.append(city)
 
-        return None
+        return cities
+
+    def extract_cities(self, messages: List[str], tokens: List[List[str]] = None) -> List[Optional[str]]:
+        """
+        Runs NER over all messages in one call, messages seen before are answered from the cache
+        """
+        if tokens is None:
+            tokens = [self.__lemmatize(message) for message in messages]
+
+        texts = [self.__ner_text(message_tokens) for message_tokens in tokens]
+        cities = {text: self.__cities.get(text) for text in texts}
+
+        missing = [text for text, city in cities.items() if city is MISSING]
+        if len(missing) > 0:
+            cities.update(zip(missing, self.__recognize_cities(missing)))
 
-    def __get_day(self, message: str) -> int:
-        lemmatized_message = self.__lemmatize(message)
+        return [cities[text] for text in texts]
 
-        if 'сегодня' in lemmatized_message:
+    def __get_city(self, tokens: List[str]) -> Optional[str]:
+        text = self.__ner_text(tokens)
+        city = self.__cities.get(text)
+
+        if city is MISSING:
+            # Live messages from concurrent chats are grouped into one NER call
+            city = self.__ner_batcher.submit(text).result()
+
+        return city
+
+    def __get_day(self, tokens: List[str]) -> int:
+        if 'сегодня' in tokens:
             return 0
-        if 'завтра' in lemmatized_message:
+        if 'завтра' in tokens:
             return 1
-        if 'неделя' in lemmatized_message:
+        if 'неделя' in tokens:
             return 7
 
         return 0
@@ -82,29 +114,73 @@ class Weather:
 
         return response
 
-    def get_weather(self, message):
-        city_name = self.__get_city(message)
+    @property
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {'coords': self.__coords.stats, 'forecasts': self.__forecasts.stats}
+
+    def __find_coord(self, city_name: str) -> Optional[Tuple[float, float]]:
+        known, coord = self.__gazetteer.lookup(city_name)
+
+        if known:
+            return coord
+
+        return self.__request_coord(city_name)
+
+    def __request_coord(self, city_name: str) -> Optional[Tuple[float, float]]:
+        current_weather_request = f'https://api.openweathermap.org/data/2.5/weather?q={city_name}' \
+                                  f'&units=metric&appid={os.environ["OPEN_WEATHER_TOKEN"]}'
+        current_weather = self.__http.get(current_weather_request).json()
+
+        if 'coord' in current_weather.keys():
+            coord = current_weather['coord']['lat'], current_weather['coord']['lon']
+            self.__gazetteer.add(city_name, coord)
+            return coord
+
+        # Only a definite "city not found" is remembered, not auth or quota errors
+        if str(current_weather.get('cod')) == '404':
+            self.__gazetteer.add(city_name, None)
+
+        return None
+
+    def __request_forecast(self, lat: float, lon: float) -> Optional[dict]:
+        weather_forecast_request = f'https://api.openweathermap.org/data/2.5/onecall?lat={lat}&lon={lon}' \
+                                   f'&exclude=minutely,hourly&units=metric&appid={os.environ["OPEN_WEATHER_TOKEN"]}'
+        weather_forecast = self.__http.get(weather_forecast_request).json()
+
+        if 'daily' in weather_forecast.keys():
+            return weather_forecast
+
+        return None
+
+    def get_weather(self, message: str, tokens: List[str] = None):
+        if tokens is None:
+            tokens = self.__lemmatize(message)
+
+        city_name = self.__get_city(tokens)
 
         if city_name is not None:
             response = ''
+            city_key = normalize_city(city_name)
 
-            current_weather_request = f'https://api.openweathermap.org/data/2.5/weather?q={city_name}' \
-                                      f'&units=metric&appid={os.environ["OPEN_WEATHER_TOKEN"]}'
-            current_weather = requests.get(current_weather_request).json()
+            try:
+                coord = self.__coords.get_or_load(city_key, lambda: self.__find_coord(city_name))
 
-            if 'coord' in current_weather.keys():
-                lon, lat = current_weather['coord']['lon'], current_weather['coord']['lat']
+                if coord is not None:
+                    lat, lon = coord
+                    weather_forecast = self.__forecasts.get_or_load(city_key, lambda: self.__request_forecast(lat, lon))
+            except (requests.RequestException, ValueError):
+                return self.__error_message
 
-                weather_forecast_request = f'https://api.openweathermap.org/data/2.5/onecall?lat={lat}&lon={lon}' \
-                                           f'&exclude=minutely,hourly&units=metric&appid={os.environ["OPEN_WEATHER_TOKEN"]}'
-                weather_forecast = requests.get(weather_forecast_request).json()
+            if coord is not None:
+                if weather_forecast is None:
+                    return self.__unknown_message
 
-                case_city_name = self._morph.parse(city_name)[0].inflect({'loct'}).word.capitalize()
+                case_city_name = self._lemmatizer.morph.parse(city_name)[0].inflect({'loct'}).word.capitalize()
 
                 response += 'Прогноз погоды в ' + case_city_name + ':\n'
                 datetime_now = datetime.now()
 
-                day = self.__get_day(message)
+                day = self.__get_day(tokens)
 
                 if day == 0:
                     response += self.__get_desctiption(0, weather_forecast['daily'][0], datetime_now)
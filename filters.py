@@ -1,19 +1,30 @@
+import os
+from concurrent.futures import TimeoutError
+
 from telegram.ext.filters import MessageFilter
 from telegram import Message
 from text_handlers import HelloTextHandler
+from analysis import analyze
 
 
 class SentimentFilter(MessageFilter):
     """
     Sentiment Analysis Filter
+
+    Takes a SentimentService or a TieredSentiment.
+    If the verdict is not ready in `timeout` seconds the message passes as not negative.
     """
-    def __init__(self, model):
+    def __init__(self, model, timeout: float = None):
         self.__model = model
+        self.__timeout = timeout if timeout is not None else float(os.environ.get('SENTIMENT_TIMEOUT', 0.5))
         self.name = 'Sentiment Filter'
 
     def filter(self, message: Message) -> bool:
         if message.text is not None:
-            return self.__model([message.text])[0] == 'negative'
+            try:
+                return self.__model.sentiment(message.text, self.__timeout, analyze(message).lemmas) == 'negative'
+            except (TimeoutError, RuntimeError):
+                return False
 
         return False
 
@@ -28,7 +39,7 @@ class HelloFilter(MessageFilter):
 
     def filter(self, message: Message) -> bool:
         if message.text is not None:
-            handler_trigger, handler_message = self.__text_handler.get(message.text)
+            handler_trigger, handler_message = self.__text_handler.get(message.text, analyze(message).lemmas)
             return handler_trigger
 
         return False
@@ -1,13 +1,17 @@
 import logging
 import os
 
-from telegram import Update, InputMediaPhoto
+from telegram import Bot, Update, InputMediaPhoto
+from telegram.error import BadRequest
 from telegram.ext import CallbackContext, Handler, CommandHandler, RegexHandler, MessageHandler, Filters, ConversationHandler
 from filters import SentimentFilter, HelloFilter
 from text_handlers import HelloTextHandler, EndTextHandler, WeatherTextHandler, BeerTextHandler, CatTextHandler
-from beer.src.beer_embedding import BeerEmbedding
-
-# from deeppavlov import build_model, configs
+from analysis import analyze
+from intent_router import IntentRouter
+from models import registry
+from beer.src.image_store import ImageStore
+from media_cache import FileIdCache
+from replies import ReplyBuffer
 
 
 class SuperHandler:
@@ -22,7 +26,7 @@ class SuperHandler:
     def handler_name(self) -> str:
         raise NotImplementedError()
 
-    def _run_handler(self, update: Update, callback_context: CallbackContext):
+    def _run_handler(self, update: Update, callback_context: CallbackContext, replies: ReplyBuffer):
         raise NotImplementedError()
 
     def _run_wrapper(self, update: Update, callback_context: CallbackContext):
@@ -34,7 +38,12 @@ class SuperHandler:
             f"Get {self.handler_name} from {update.effective_chat.id} ({update.effective_chat.username})"
         )
 
-        return self._run_handler(update, callback_context)
+        # Replies are sent after the handler returns, in the background and in order for the chat
+        replies = ReplyBuffer(callback_context.bot, update.effective_chat.id)
+        try:
+            return self._run_handler(update, callback_context, replies)
+        finally:
+            replies.flush()
 
     def create(self) -> Handler:
         raise NotImplementedError()
@@ -53,8 +62,8 @@ class StartHandler(SuperHandler):
     def handler_name(self) -> str:
         return 'start'
 
-    def _run_handler(self, update: Update, callback_context: CallbackContext):
-        callback_context.bot.send_message(chat_id=update.effective_chat.id, text=self.__message)
+    def _run_handler(self, update: Update, callback_context: CallbackContext, replies: ReplyBuffer):
+        replies.text(self.__message)
 
         return self._default_state
 
@@ -75,8 +84,8 @@ class EndHandler(SuperHandler):
     def handler_name(self) -> str:
         return 'end'
 
-    def _run_handler(self, update: Update, callback_context: CallbackContext):
-        callback_context.bot.send_message(chat_id=update.effective_chat.id, text=self.__message)
+    def _run_handler(self, update: Update, callback_context: CallbackContext, replies: ReplyBuffer):
+        replies.text(self.__message)
         callback_context.user_data.clear()
 
         return ConversationHandler.END
@@ -98,35 +107,34 @@ class UnknownHandler(SuperHandler):
     def handler_name(self) -> str:
         return 'unknown'
 
-    def _run_handler(self, update: Update, callback_context: CallbackContext):
-        callback_context.bot.send_message(chat_id=update.effective_chat.id, text=self.__message)
+    def _run_handler(self, update: Update, callback_context: CallbackContext, replies: ReplyBuffer):
+        replies.text(self.__message)
 
     def create(self) -> Handler:
         return MessageHandler(Filters.regex(r'.*'), self._run_wrapper)
 
 
-# class SentimentHandler(SuperHandler):
-#     """
-#     Handler for toxic messages
-#     """
-#     def __init__(self, default_state: int = 0):
-#         super().__init__(default_state)
-#
-#         self.__message = 'Давай повежливее...'
-#         model = build_model(configs.classifiers.rusentiment_bert, download=True)
-#         self.__filter = SentimentFilter(model)
-#
-#     @property
-#     def handler_name(self) -> str:
-#         return 'sentiment'
-#
-#     def _run_handler(self, update: Update, callback_context: CallbackContext):
-#         callback_context.bot.send_message(chat_id=update.effective_chat.id, text=self.__message)
-#
-#         return self._default_state
-#
-#     def create(self) -> Handler:
-#         return MessageHandler(self.__filter, self._run_wrapper)
+class SentimentHandler(SuperHandler):
+    """
+    Handler for toxic messages
+    """
+    def __init__(self, default_state: int = 0):
+        super().__init__(default_state)
+
+        self.__message = 'Давай повежливее...'
+        self.__filter = SentimentFilter(registry.get('sentiment'))
+
+    @property
+    def handler_name(self) -> str:
+        return 'sentiment'
+
+    def _run_handler(self, update: Update, callback_context: CallbackContext, replies: ReplyBuffer):
+        replies.text(self.__message)
+
+        return self._default_state
+
+    def create(self) -> Handler:
+        return MessageHandler(self.__filter, self._run_wrapper)
 
 
 class MainMessageHandler(SuperHandler):
@@ -148,6 +156,7 @@ class MainMessageHandler(SuperHandler):
             BeerTextHandler(),
             EndTextHandler()
         ]
+        self.__router = IntentRouter(self.__text_handlers)
 
         self.__hello_filter = HelloFilter()
         self.__ask_message = 'Могу ли я тебе что-то подсказать?'
@@ -156,22 +165,20 @@ class MainMessageHandler(SuperHandler):
     def handler_name(self) -> str:
         return 'main message'
 
-    def _run_handler(self, update: Update, callback_context: CallbackContext):
+    def _run_handler(self, update: Update, callback_context: CallbackContext, replies: ReplyBuffer):
         logger_message = ''
 
         end_activated = False
         beer_activated = False
         messages = []
+        tokens = analyze(update.message).lemmas
 
-        for handler in self.__text_handlers:
-            handler_trigger, handler_message = handler.get(update.message.text)
-
-            if handler_trigger:
-                messages += [handler_message]
-                logger_message += handler.handler_name + ', '
+        for handler in self.__router.route(tokens):
+            messages += [handler.get_message(update.message.text, tokens)]
+            logger_message += handler.handler_name + ', '
 
-                end_activated = end_activated or handler.handler_name == 'end'
-                beer_activated = beer_activated or handler.handler_name == 'beer'
+            end_activated = end_activated or handler.handler_name == 'end'
+            beer_activated = beer_activated or handler.handler_name == 'beer'
 
         if len(logger_message) > 0 and not(end_activated and beer_activated):
             self.__logger.info(
@@ -179,7 +186,7 @@ class MainMessageHandler(SuperHandler):
             )
 
             for message in messages:
-                callback_context.bot.send_message(chat_id=update.effective_chat.id, text=message)
+                replies.text(message)
 
             if end_activated:
                 return ConversationHandler.END
@@ -189,9 +196,9 @@ class MainMessageHandler(SuperHandler):
             self.__logger.info(
                 f"Didn't understand message from {update.effective_chat.id} ({update.effective_chat.username})."
             )
-            callback_context.bot.send_message(chat_id=update.effective_chat.id, text=self.__unknown_message)
+            replies.text(self.__unknown_message)
 
-        callback_context.bot.send_message(chat_id=update.effective_chat.id, text=self.__ask_message)
+        replies.text(self.__ask_message)
 
         return self.__main_state
 
@@ -210,24 +217,53 @@ class BeerHandler(SuperHandler):
         super().__init__(default_state)
 
         self.__ask_message = 'Может ты хочешь что-то кроме пива?'
-        self.__model = BeerEmbedding()
         self.__path_to_images = 'beer/'
+        self.__images = ImageStore()
+        self.__file_ids = FileIdCache()
+        self.__logger = logging.getLogger(__file__)
 
     @property
     def handler_name(self) -> str:
         return 'beer'
 
-    def _run_handler(self, update: Update, callback_context: CallbackContext):
-        beer_list = self.__model.match(update.message.text)
+    def __create_media(self, beer_list, paths, file_ids):
+        media = []
+        for beer, path, file_id in zip(beer_list, paths, file_ids):
+            if file_id is None:
+                with open(path, 'rb') as f:
+                    media.append(InputMediaPhoto(media=f.read(), caption=beer.name, filename=os.path.basename(path)))
+            else:
+                media.append(InputMediaPhoto(media=file_id, caption=beer.name))
+
+        return media
+
+    def __send_images(self, bot: Bot, chat_id: int, beer_list):
+        paths = [self.__images.get(os.path.join(self.__path_to_images, x.img_path[3:])) for x in beer_list]
+        file_ids = [self.__file_ids.get(path) for path in paths]
+
+        try:
+            messages = bot.send_media_group(chat_id, self.__create_media(beer_list, paths, file_ids))
+        except BadRequest as e:
+            if all(file_id is None for file_id in file_ids):
+                raise
+
+            self.__logger.warning(f"Cached file ids were rejected ({e}), uploading images again")
+            self.__file_ids.delete(paths)
+            messages = bot.send_media_group(chat_id, self.__create_media(beer_list, paths, [None] * len(paths)))
+
+        for path, message in zip(paths, messages):
+            if message.photo:
+                self.__file_ids.set(path, message.photo[-1].file_id)
 
-        media = [InputMediaPhoto(media=open(os.path.join(self.__path_to_images, x.img_path[3:]), 'rb'),
-                                 caption=x.name) for x in beer_list]
+    def _run_handler(self, update: Update, callback_context: CallbackContext, replies: ReplyBuffer):
+        analysis = analyze(update.message)
+        beer_list = registry.get('beer_embedding').match(analysis.text, tokens=analysis.natasha_lemmas)
 
         return_message = '\n'.join([f'{i}. {x.name}'for i, x in enumerate(beer_list)])
 
-        callback_context.bot.send_message(chat_id=update.effective_chat.id, text=return_message)
-        update.message.reply_media_group(media)
-        callback_context.bot.send_message(chat_id=update.effective_chat.id, text=self.__ask_message)
+        replies.text(return_message)
+        replies.call(self.__send_images, callback_context.bot, update.effective_chat.id, beer_list, cost=len(beer_list))
+        replies.text(self.__ask_message)
 
         return self._default_state
 
@@ -249,8 +285,8 @@ class HelpHandler(SuperHandler):
     def handler_name(self) -> str:
         return 'help'
 
-    def _run_handler(self, update: Update, callback_context: CallbackContext):
-        callback_context.bot.send_message(chat_id=update.effective_chat.id, text=self.__message)
+    def _run_handler(self, update: Update, callback_context: CallbackContext, replies: ReplyBuffer):
+        replies.text(self.__message)
 
         return self._default_state
 
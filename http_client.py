@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpClient:
+    """
+    Shared HTTP client: keep-alive connection pools, per-host connection limit,
+    timeouts, retries with exponential backoff and per-host latency metrics
+    """
+    def __init__(self, timeout=(3.05, 10), retries: int = 3, backoff_factor: float = 0.3,
+                 max_hosts: int = 10, max_connections_per_host: int = 10):
+        self.__timeout = timeout
+        self.__session = requests.Session()
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['HEAD', 'GET']),
+                      respect_retry_after_header=True, raise_on_status=False)
+        # pool_block makes callers wait for a free connection instead of opening more than the limit
+        adapter = HTTPAdapter(pool_connections=max_hosts, pool_maxsize=max_connections_per_host,
+                              pool_block=True, max_retries=retry)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+
+        self.__lock = threading.Lock()
+        self.__metrics = {}
+
+    @property
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        with self.__lock:
+            return {
+                host: {'requests': count, 'errors': errors,
+                       'mean_ms': total / count * 1e3, 'max_ms': max_latency * 1e3}
+                for host, (count, errors, total, max_latency) in self.__metrics.items()
+            }
+
+    def __record(self, url: str, latency: float, error: bool):
+        host = urlsplit(url).netloc
+
+        with self.__lock:
+            count, errors, total, max_latency = self.__metrics.get(host, (0, 0, 0., 0.))
+            self.__metrics[host] = (count + 1, errors + int(error), total + latency, max(max_latency, latency))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.__timeout)
+        start = time.perf_counter()
+        error = True
+
+        try:
+            response = self.__session.request(method, url, **kwargs)
+            error = not response.ok
+            return response
+        finally:
+            self.__record(url, time.perf_counter() - start, error)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request('HEAD', url, **kwargs)
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    global _http_client
+
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+
+    return _http_client
@@ -0,0 +1,71 @@
+from functools import lru_cache
+from typing import FrozenSet, List
+
+from lemmatizer import PUNCTUATION
+
+
+class PrefixTrie:
+    """
+    Trie of prefix triggers matched at the start of a token
+    """
+    def __init__(self):
+        self.__goto = [{}]
+        self.__output = [frozenset()]
+
+    def add(self, prefix: str, value: int):
+        state = 0
+        for char in prefix:
+            if char not in self.__goto[state]:
+                self.__goto.append({})
+                self.__output.append(frozenset())
+                self.__goto[state][char] = len(self.__goto) - 1
+            state = self.__goto[state][char]
+
+        self.__output[state] = self.__output[state] | {value}
+
+    def search(self, token: str) -> FrozenSet[int]:
+        found = frozenset()
+        state = 0
+
+        for char in token:
+            state = self.__goto[state].get(char)
+            if state is None:
+                break
+            found = found | self.__output[state]
+
+        return found
+
+
+class IntentRouter:
+    """
+    Resolves all text handlers triggered by a lemmatized message in one pass
+    """
+    def __init__(self, handlers: List, cache_size: int = 100000):
+        self.__handlers = list(handlers)
+        self.__exact = {}
+        self.__prefixes = PrefixTrie()
+
+        for i, handler in enumerate(self.__handlers):
+            for trigger in handler.triggers:
+                self.__exact[trigger] = self.__exact.get(trigger, frozenset()) | {i}
+            for trigger in handler.prefix_triggers:
+                self.__prefixes.add(trigger, i)
+
+        self.__lookup = lru_cache(maxsize=cache_size)(self.__lookup_token)
+
+    @property
+    def handlers(self) -> List:
+        return self.__handlers
+
+    def __lookup_token(self, token: str) -> FrozenSet[int]:
+        # Tokens may come with punctuation from callers that split the text themselves
+        token = token.strip(PUNCTUATION).lower()
+        return self.__exact.get(token, frozenset()) | self.__prefixes.search(token)
+
+    def route(self, tokens: List[str]) -> List:
+        found = set()
+
+        for token in tokens:
+            found.update(self.__lookup(token))
+
+        return [self.__handlers[i] for i in sorted(found)]
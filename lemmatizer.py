@@ -0,0 +1,46 @@
+import string
+from functools import lru_cache
+from typing import List
+
+import pymorphy2
+
+
+PUNCTUATION = string.punctuation + '«»„“”…—–'
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Whitespace tokens without leading and trailing punctuation, so 'погода?' matches 'погода'
+    """
+    tokens = [x.strip(PUNCTUATION) for x in text.split()]
+    return [x for x in tokens if len(x) > 0]
+
+
+class Lemmatizer:
+    """
+    Process-wide pymorphy2 lemmatizer with LRU cache by word form
+    """
+    def __init__(self, cache_size: int = 100000):
+        self.__morph = pymorphy2.MorphAnalyzer()
+        self.__normal_form = lru_cache(maxsize=cache_size)(self.__parse_normal_form)
+
+    @property
+    def morph(self) -> pymorphy2.MorphAnalyzer:
+        return self.__morph
+
+    def __parse_normal_form(self, word: str) -> str:
+        return self.__morph.parse(word)[0].normal_form
+
+    def normal_form(self, word: str) -> str:
+        return self.__normal_form(word)
+
+    def lemmatize(self, text: str) -> List[str]:
+        return [self.__normal_form(word) for word in tokenize(text)]
+
+    def cache_info(self):
+        return self.__normal_form.cache_info()
+
+
+def get_lemmatizer() -> Lemmatizer:
+    from models import registry
+    return registry.get('lemmatizer')
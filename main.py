@@ -1,6 +1,10 @@
+import argparse
+import time
+
 from TelegramBot import TelegramBot
 
 from data import get_data
+from models import current_rss, registry
 
 
 def main() -> None:
@@ -8,6 +12,36 @@ def main() -> None:
     bot.start()
 
 
-if __name__ == '__main__':
+def profile_startup() -> None:
+    """
+    Prints how long each startup step and model takes to load and how much memory it adds
+    """
+    start, rss = time.perf_counter(), current_rss()
     get_data()
-    main()
+    print(f'data: {time.perf_counter() - start:.2f}s')
+
+    bot_start = time.perf_counter()
+    bot = TelegramBot()
+    print(f'bot: {time.perf_counter() - bot_start:.2f}s')
+
+    for thread in bot.preload_threads:
+        thread.join()
+
+    for name, item in sorted(registry.profile.items(), key=lambda x: -x[1]['seconds']):
+        print(f'{name}: {item["seconds"]:.2f}s, {item["rss_delta"] / 2 ** 20:+.1f} MiB')
+
+    print(f'total: {time.perf_counter() - start:.2f}s, {(current_rss() - rss) / 2 ** 20:+.1f} MiB, '
+          f'rss {current_rss() / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Telegram bot')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='load everything, print the startup profile and exit')
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup()
+    else:
+        get_data()
+        main()
@@ -0,0 +1,36 @@
+import os
+import os.path as osp
+import sqlite3
+import threading
+from typing import List, Optional
+
+
+class FileIdCache:
+    """
+    Persistent cache from a local media path to the Telegram file_id it was uploaded as
+    """
+    def __init__(self, path: str = 'cache/file_ids.sqlite3'):
+        if osp.dirname(path):
+            os.makedirs(osp.dirname(path), exist_ok=True)
+
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                'CREATE TABLE IF NOT EXISTS file_ids (path TEXT PRIMARY KEY, file_id TEXT NOT NULL)'
+            )
+
+    def get(self, path: str) -> Optional[str]:
+        with self.__lock:
+            row = self.__connection.execute('SELECT file_id FROM file_ids WHERE path = ?', (path,)).fetchone()
+
+        return row[0] if row is not None else None
+
+    def set(self, path: str, file_id: str):
+        with self.__lock, self.__connection:
+            self.__connection.execute('INSERT OR REPLACE INTO file_ids (path, file_id) VALUES (?, ?)', (path, file_id))
+
+    def delete(self, paths: List[str]):
+        with self.__lock, self.__connection:
+            self.__connection.executemany('DELETE FROM file_ids WHERE path = ?', [(path,) for path in paths])
@@ -0,0 +1,157 @@
+import os
+import resource
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+
+def current_rss() -> int:
+    """
+    Resident set size of the process in bytes
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Peak RSS is the closest portable value, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ModelRegistry:
+    """
+    Loads each heavy resource once, on first use or in background threads, and shares it
+    """
+    def __init__(self):
+        self.__loaders = {}
+        self.__preloaded = []
+        self.__futures = {}
+        self.__profile = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.__loaders)
+
+    @property
+    def profile(self) -> Dict[str, Dict[str, float]]:
+        """
+        Load time and RSS growth per component. Components loaded in parallel share the RSS growth.
+        """
+        with self.__lock:
+            return dict(self.__profile)
+
+    def register(self, name: str, loader: Callable, preload: bool = True):
+        with self.__lock:
+            self.__loaders[name] = loader
+            if preload:
+                self.__preloaded.append(name)
+
+    def get(self, name: str):
+        with self.__lock:
+            if name not in self.__loaders:
+                raise KeyError(f'Unknown model "{name}"')
+
+            future = self.__futures.get(name)
+            owner = future is None
+            if owner:
+                future = self.__futures[name] = Future()
+
+        if not owner:
+            return future.result()
+
+        start, rss = time.perf_counter(), current_rss()
+        try:
+            value = self.__loaders[name]()
+        except BaseException as e:
+            with self.__lock:
+                del self.__futures[name]
+            future.set_exception(e)
+            raise
+
+        with self.__lock:
+            self.__profile[name] = {'seconds': time.perf_counter() - start, 'rss_delta': current_rss() - rss}
+
+        future.set_result(value)
+        return value
+
+    def preload(self, names: List[str] = None) -> List[threading.Thread]:
+        threads = []
+        if names is None:
+            with self.__lock:
+                names = list(self.__preloaded)
+
+        for name in names:
+            thread = threading.Thread(target=self.__preload, args=(name,), name=f'preload-{name}', daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        return threads
+
+    def __preload(self, name: str):
+        try:
+            self.get(name)
+        except Exception:
+            # The error is raised again to whoever uses the model first
+            pass
+
+
+registry = ModelRegistry()
+
+
+def _lemmatizer():
+    from lemmatizer import Lemmatizer
+    return Lemmatizer()
+
+
+def _navec():
+    from embeddings import load_navec
+    return load_navec()
+
+
+def _ner():
+    from slovnet import NER
+    ner = NER.load('weights/slovnet_ner_news_v1.tar', batch_size=32)
+    ner.navec(registry.get('navec'))
+    return ner
+
+
+def _segmenter():
+    from natasha import Segmenter
+    return Segmenter()
+
+
+def _morph_vocab():
+    from natasha import MorphVocab
+    return MorphVocab()
+
+
+def _news_morph_tagger():
+    from natasha import NewsMorphTagger
+    # natasha's NewsEmbedding is the same navec_news_v1 table, so the tagger shares the one loaded for NER
+    return NewsMorphTagger(registry.get('navec'))
+
+
+def _sentiment():
+    from sentiment import HashedLinearSentiment, SentimentService, TieredSentiment
+    heavy = SentimentService()
+
+    # With trained weights for the cheap model only the messages it is unsure about reach BERT
+    path = os.environ.get('SENTIMENT_LINEAR_WEIGHTS', 'weights/sentiment_linear.npz')
+    return TieredSentiment(HashedLinearSentiment.load(path), heavy) if os.path.exists(path) else heavy
+
+
+def _beer_embedding():
+    from beer.src.beer_embedding import BeerEmbedding
+    return BeerEmbedding()
+
+
+registry.register('lemmatizer', _lemmatizer)
+registry.register('navec', _navec)
+registry.register('ner', _ner)
+registry.register('segmenter', _segmenter)
+registry.register('morph_vocab', _morph_vocab)
+registry.register('news_morph_tagger', _news_morph_tagger)
+registry.register('beer_embedding', _beer_embedding)
+# Started only when the sentiment handlers are on
+registry.register('sentiment', _sentiment, preload=False)
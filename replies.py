@@ -0,0 +1,170 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, List
+
+from telegram import Bot
+from telegram.error import RetryAfter
+
+from cache import LRUCache, MISSING
+from concurrency import Defer, KeyedExecutor, RateLimiter
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class _Reply:
+    """
+    A send and the state it keeps between its attempts
+    """
+    def __init__(self, fn: Callable, args, kwargs, cost: int):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cost = cost
+        self.attempt = 0
+        self.chat_token = False
+        self.global_token = False
+
+
+class ReplySender:
+    """
+    Sends replies in the background, in order within a chat and concurrently across chats.
+
+    Every send takes a token from the chat's and the global bucket, so the bot stays under Telegram's limits:
+    about 30 messages per second overall, 1 per second in a private chat and 20 per minute in a group.
+    A 429 is retried after the time Telegram asks for.
+    A send that has to wait is deferred instead of sleeping, so a busy chat never holds a worker.
+    """
+    def __init__(self, max_workers: int = 8, global_rate: float = 30., chat_rate: float = 1.,
+                 group_rate: float = 20 / 60, chat_burst: int = 3, max_retries: int = 3):
+        self.__logger = logging.getLogger(__file__)
+        self.__executor = KeyedExecutor(max_workers, thread_name_prefix='replies')
+        self.__global_burst = max(1, int(global_rate))
+        self.__global_limiter = RateLimiter(global_rate, burst=self.__global_burst)
+        self.__chat_rate = chat_rate
+        self.__group_rate = group_rate
+        self.__chat_burst = chat_burst
+        self.__max_retries = max_retries
+
+        self.__chat_limiters = LRUCache(max_size=10000)
+        self.__chat_limiters_lock = threading.Lock()
+
+    def __chat_limiter(self, chat_id: int) -> RateLimiter:
+        with self.__chat_limiters_lock:
+            limiter = self.__chat_limiters.get(chat_id)
+            if limiter is MISSING:
+                # Group and channel ids are negative
+                rate = self.__chat_rate if chat_id > 0 else self.__group_rate
+                limiter = RateLimiter(rate, burst=self.__chat_burst)
+                self.__chat_limiters.put(chat_id, limiter)
+            return limiter
+
+    def __reserve(self, chat_id: int, reply: _Reply) -> float:
+        """
+        Takes the reply's tokens, returns 0 or how long to wait for the missing ones
+        """
+        if not reply.chat_token:
+            wait = self.__chat_limiter(chat_id).reserve(1)
+            if wait > 0:
+                return wait
+            reply.chat_token = True
+
+        if not reply.global_token:
+            # A media group is one request for the chat but counts as `cost` messages against the global limit
+            wait = self.__global_limiter.reserve(min(reply.cost, self.__global_burst))
+            if wait > 0:
+                return wait
+            reply.global_token = True
+
+        return 0.
+
+    def __send(self, chat_id: int, reply: _Reply):
+        wait = self.__reserve(chat_id, reply)
+        if wait > 0:
+            raise Defer(wait)
+
+        try:
+            return reply.fn(*reply.args, **reply.kwargs)
+        except RetryAfter as e:
+            if reply.attempt == self.__max_retries:
+                raise
+            reply.attempt += 1
+            self.__logger.warning(f'Flood control for chat {chat_id}, retrying in {e.retry_after}s')
+            raise Defer(e.retry_after)
+
+    def __log_error(self, chat_id: int, future: Future):
+        if future.exception() is not None:
+            self.__logger.error(f"Can't send a reply to {chat_id}: {future.exception()!r}")
+
+    def submit(self, chat_id: int, fn: Callable, *args, cost: int = 1, **kwargs) -> Future:
+        """
+        Schedules `fn(*args, **kwargs)`, a send that counts as `cost` messages
+        """
+        future = self.__executor.submit(chat_id, self.__send, chat_id, _Reply(fn, args, kwargs, cost))
+        future.add_done_callback(lambda x: self.__log_error(chat_id, x))
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self.__executor.shutdown(wait=wait)
+
+
+class ReplyBuffer:
+    """
+    Replies to one update. Consecutive texts are merged into one message, `flush` hands everything to the sender.
+    """
+    def __init__(self, bot: Bot, chat_id: int, sender: ReplySender = None, separator: str = '\n\n'):
+        self.__bot = bot
+        self.__chat_id = chat_id
+        self.__sender = sender or get_reply_sender()
+        self.__separator = separator
+        # Texts are lists of parts, other sends are (fn, args, kwargs, cost)
+        self.__items = []
+
+    def text(self, text: str):
+        last = self.__items[-1] if len(self.__items) > 0 else None
+        if isinstance(last, list) and len(self.__separator.join(last + [text])) <= MAX_MESSAGE_LENGTH:
+            last.append(text)
+        else:
+            self.__items.append([text])
+
+    def call(self, fn: Callable, *args, cost: int = 1, **kwargs):
+        """
+        Adds any other send, e.g. a media group, it runs after the replies added before it
+        """
+        self.__items.append((fn, args, kwargs, cost))
+
+    def flush(self) -> List[Future]:
+        futures = []
+        for item in self.__items:
+            if isinstance(item, list):
+                futures.append(self.__sender.submit(self.__chat_id, self.__bot.send_message,
+                                                    self.__chat_id, self.__separator.join(item)))
+            else:
+                fn, args, kwargs, cost = item
+                futures.append(self.__sender.submit(self.__chat_id, fn, *args, cost=cost, **kwargs))
+
+        self.__items = []
+        return futures
+
+
+def reply_workers() -> int:
+    return int(os.environ.get('BOT_REPLY_WORKERS', 8))
+
+
+_reply_sender = None
+_reply_sender_lock = threading.Lock()
+
+
+def get_reply_sender() -> ReplySender:
+    global _reply_sender
+
+    with _reply_sender_lock:
+        if _reply_sender is None:
+            _reply_sender = ReplySender(
+                max_workers=reply_workers(),
+                global_rate=float(os.environ.get('BOT_GLOBAL_RATE', 30)),
+                chat_rate=float(os.environ.get('BOT_CHAT_RATE', 1)),
+            )
+
+    return _reply_sender
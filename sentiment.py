@@ -0,0 +1,279 @@
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import string
+import threading
+import zlib
+from concurrent.futures import Future
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from cache import LRUCache, MISSING
+from concurrency import MicroBatcher
+from lemmatizer import get_lemmatizer
+
+LINEAR_WEIGHTS_PATH = 'weights/sentiment_linear.npz'
+
+
+def build_rusentiment():
+    from deeppavlov import build_model, configs
+    return build_model(configs.classifiers.rusentiment_bert, download=True)
+
+
+def _serve(model_factory: Callable, requests: multiprocessing.Queue, responses: multiprocessing.Queue):
+    """
+    Sentiment worker process: reads batches of texts, answers with (ok, labels or error)
+    """
+    try:
+        model, error = model_factory(), None
+    except Exception as e:
+        model, error = None, f"Can't load the sentiment model: {e!r}"
+
+    while True:
+        texts = requests.get()
+        if texts is None:
+            return
+
+        if model is None:
+            responses.put((False, error))
+            continue
+
+        try:
+            responses.put((True, [str(label) for label in model(texts)]))
+        except Exception as e:
+            responses.put((False, repr(e)))
+
+
+class SentimentService:
+    """
+    Sentiment of messages from a model running in its own process.
+
+    Messages from all chats are sent to the model in micro-batches,
+    verdicts are cached by the hash of the text.
+    """
+    def __init__(self, model_factory: Callable = build_rusentiment, max_batch_size: int = 32,
+                 max_delay: float = None, cache_size: int = 10000):
+        if max_delay is None:
+            max_delay = float(os.environ.get('SENTIMENT_BATCH_DELAY', 0.01))
+
+        self.__logger = logging.getLogger(__file__)
+        self.__model_factory = model_factory
+        # The model process must not inherit the bot's threads and sockets
+        self.__context = multiprocessing.get_context('spawn')
+        self.__process = None
+        self.__process_lock = threading.Lock()
+
+        self.__verdicts = LRUCache(cache_size)
+        self.__batcher = MicroBatcher(self.__predict, max_batch_size=max_batch_size, max_delay=max_delay,
+                                      name='sentiment')
+        self.__start()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def __start(self):
+        with self.__process_lock:
+            if self.__process is not None and self.__process.is_alive():
+                return
+
+            self.__requests = self.__context.Queue()
+            self.__responses = self.__context.Queue()
+            self.__process = self.__context.Process(
+                target=_serve, args=(self.__model_factory, self.__requests, self.__responses),
+                name='sentiment-model', daemon=True
+            )
+            self.__process.start()
+
+    def __predict(self, texts: List[str]) -> List[str]:
+        # Runs in the batcher thread, so there is one batch in the model process at a time
+        self.__start()
+        self.__requests.put(texts)
+
+        while True:
+            try:
+                ok, result = self.__responses.get(timeout=1.)
+                break
+            except queue.Empty:
+                if not self.__process.is_alive():
+                    self.__logger.error('Sentiment model process died, it will be restarted')
+                    raise RuntimeError('Sentiment model process died')
+
+        if not ok:
+            raise RuntimeError(result)
+
+        for text, label in zip(texts, result):
+            self.__verdicts.put(self.key(text), label)
+        return result
+
+    def submit(self, text: str) -> Future:
+        label = self.__verdicts.get(self.key(text))
+        if label is not MISSING:
+            future = Future()
+            future.set_result(label)
+            return future
+
+        return self.__batcher.submit(text)
+
+    def predict(self, texts: List[str]) -> List[str]:
+        return [future.result() for future in [self.submit(text) for text in texts]]
+
+    def sentiment(self, text: str, timeout: float = None, tokens: List[str] = None) -> str:
+        # tokens are accepted for compatibility with TieredSentiment, the model reads the raw text
+        return self.submit(text).result(timeout)
+
+    def close(self):
+        with self.__process_lock:
+            if self.__process is not None and self.__process.is_alive():
+                self.__requests.put(None)
+                self.__process.join(5)
+
+
+class HashedLinearSentiment:
+    """
+    Cheap sentiment model: logistic regression over hashed lemma unigrams and bigrams
+    """
+    def __init__(self, classes: Sequence[str], weights: np.ndarray = None, bias: np.ndarray = None,
+                 n_features: int = 2 ** 18):
+        self.classes = list(classes)
+        self.n_features = n_features
+        self.weights = weights if weights is not None else np.zeros((n_features, len(self.classes)), np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(self.classes), np.float32)
+        self._lemmatizer = get_lemmatizer()
+
+    def features(self, text: str, tokens: List[str] = None) -> np.ndarray:
+        if tokens is None:
+            tokens = self._lemmatizer.lemmatize(text)
+
+        words = [x.strip(string.punctuation) for x in tokens]
+        words = [x for x in words if len(x) > 0]
+        grams = words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+        # crc32 is stable between processes, unlike hash()
+        return np.unique(np.array([zlib.crc32(x.encode()) % self.n_features for x in grams], dtype=np.int64))
+
+    def __logits(self, features: List[np.ndarray]) -> np.ndarray:
+        logits = np.tile(self.bias, (len(features), 1))
+        for i, x in enumerate(features):
+            logits[i] += self.weights[x].sum(axis=0)
+        return logits
+
+    @staticmethod
+    def __softmax(logits: np.ndarray) -> np.ndarray:
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, texts: List[str], tokens: List[List[str]] = None) -> np.ndarray:
+        tokens = tokens if tokens is not None else [None] * len(texts)
+        return self.__softmax(self.__logits([self.features(t, x) for t, x in zip(texts, tokens)]))
+
+    def predict(self, text: str, tokens: List[str] = None) -> Tuple[str, float]:
+        proba = self.predict_proba([text], [tokens])[0]
+        return self.classes[int(proba.argmax())], float(proba.max())
+
+    def fit(self, texts: List[str], labels: List[str], epochs: int = 20, lr: float = 1.,
+            l2: float = 1e-6, batch_size: int = 64, seed: int = 0) -> 'HashedLinearSentiment':
+        features = [self.features(text) for text in texts]
+        targets = np.eye(len(self.classes), dtype=np.float32)[[self.classes.index(x) for x in labels]]
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(features))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                batch_features = [features[i] for i in batch]
+                grad = (self.__softmax(self.__logits(batch_features)) - targets[batch]) / len(batch)
+
+                rows = np.concatenate(batch_features)
+                row_grads = np.repeat(grad, [len(x) for x in batch_features], axis=0)
+                self.weights *= 1 - lr * l2
+                np.add.at(self.weights, rows, -lr * row_grads)
+                self.bias -= lr * grad.sum(axis=0)
+
+        return self
+
+    @classmethod
+    def distill(cls, texts: List[str], teacher: Callable[[List[str]], List[str]], n_features: int = 2 ** 18,
+                **kwargs) -> 'HashedLinearSentiment':
+        """
+        A model fitted on the labels the heavy model gives to `texts`
+        """
+        labels = list(teacher(texts))
+        return cls(sorted(set(labels)), n_features=n_features).fit(texts, labels, **kwargs)
+
+    def save(self, path: str = LINEAR_WEIGHTS_PATH):
+        rows = np.flatnonzero(np.any(self.weights != 0, axis=1))
+        np.savez_compressed(path, classes=np.array(self.classes), n_features=self.n_features,
+                            rows=rows, weights=self.weights[rows], bias=self.bias)
+
+    @classmethod
+    def load(cls, path: str = LINEAR_WEIGHTS_PATH) -> 'HashedLinearSentiment':
+        with np.load(path) as data:
+            n_features = int(data['n_features'])
+            weights = np.zeros((n_features, len(data['classes'])), np.float32)
+            weights[data['rows']] = data['weights']
+            return cls([str(x) for x in data['classes']], weights, data['bias'].astype(np.float32), n_features)
+
+
+class TieredSentiment:
+    """
+    Answers with the cheap model when it is confident and asks the heavy one otherwise
+    """
+    def __init__(self, fast: HashedLinearSentiment, heavy: SentimentService, threshold: float = None):
+        self.__fast = fast
+        self.__heavy = heavy
+        self.__threshold = threshold if threshold is not None else float(os.environ.get('SENTIMENT_CONFIDENCE', 0.9))
+        self.__lock = threading.Lock()
+        self.__fast_count = 0
+        self.__heavy_count = 0
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            total = self.__fast_count + self.__heavy_count
+            return {'fast': self.__fast_count, 'heavy': self.__heavy_count,
+                    'heavy_share': self.__heavy_count / total if total > 0 else 0.}
+
+    def sentiment(self, text: str, timeout: float = None, tokens: List[str] = None) -> str:
+        label, confidence = self.__fast.predict(text, tokens)
+        confident = confidence >= self.__threshold
+
+        with self.__lock:
+            if confident:
+                self.__fast_count += 1
+            else:
+                self.__heavy_count += 1
+
+        return label if confident else self.__heavy.sentiment(text, timeout)
+
+    def close(self):
+        self.__heavy.close()
+
+
+def _read_texts(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf8') as f:
+        return [line.strip() for line in f if len(line.strip()) > 0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the fast sentiment tier')
+    parser.add_argument('command', choices=['fit', 'distill'])
+    parser.add_argument('data', help='fit: "label<TAB>text" lines, distill: one text per line')
+    parser.add_argument('--out', default=LINEAR_WEIGHTS_PATH)
+    parser.add_argument('--epochs', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        labels, texts = zip(*(line.split('\t', 1) for line in _read_texts(args.data)))
+        model = HashedLinearSentiment(sorted(set(labels))).fit(list(texts), list(labels), epochs=args.epochs)
+    else:
+        texts = _read_texts(args.data)
+        service = SentimentService()
+        model = HashedLinearSentiment.distill(texts, service.predict, epochs=args.epochs)
+        service.close()
+
+    model.save(args.out)
+    print(f'Saved {args.out}: {len(model.classes)} classes')
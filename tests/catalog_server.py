@@ -0,0 +1,109 @@
+"""
+Local stand-in for the beer catalog, used by the scraper tests and benchmarks.scraper
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import parse_qs, urlsplit
+
+PAGE_SIZE = 20
+
+PRODUCT = '''<html><body>
+<ul class="list-description list-description-lined">
+<li>
+<span>Стиль:</span>
+<a>Лагер</a>, <a>Пилснер</a>
+</li>
+<li>
+<span>Крепость:</span>
+<span>4.{n}%</span>
+</li>
+</ul>
+<a class="img-container fancybox" href="/images/beer-{n}.jpg">img</a>
+<div class="price">{n}0 руб.</div>
+<div class="tag-block"><a>солод</a><a>хмель</a></div>
+<div class="tag-block"><a>сыр</a></div>
+</body></html>'''
+
+
+class CatalogServer:
+    """
+    Threaded HTTP server with `products` beers in pages of PAGE_SIZE, records the path of every request
+    """
+    def __init__(self, products: int, latency: float = 0., host: str = '127.0.0.1', port: int = 0):
+        self.products = products
+        self.latency = latency
+        self.__paths = []
+        self.__lock = threading.Lock()
+
+        catalog = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def __send(self, body: bytes, content_type: str = 'text/html; charset=utf-8', status: int = 200):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                catalog.record(self.path)
+                time.sleep(catalog.latency)
+
+                url = urlsplit(self.path)
+                if url.path == '/beer/all/':
+                    page = int(parse_qs(url.query)['page'][0])
+                    ids = range((page - 1) * PAGE_SIZE, min(page * PAGE_SIZE, catalog.products))
+                    if len(ids) == 0:
+                        return self.__send(b'not found', status=404)
+                    links = ''.join(f'<p class="title"><a href="/products/beer-{i}.html">Beer {i}</a></p>'
+                                    for i in ids)
+                    return self.__send(f'<html><body>{links}</body></html>'.encode())
+
+                if url.path.startswith('/products/'):
+                    n = url.path[len('/products/beer-'):-len('.html')]
+                    return self.__send(PRODUCT.format(n=n).encode())
+
+                if url.path.startswith('/images/'):
+                    return self.__send(b'\xff\xd8' + bytes(1024), content_type='image/jpeg')
+
+                self.__send(b'not found', status=404)
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='catalog', daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def paths(self) -> List[str]:
+        with self.__lock:
+            return list(self.__paths)
+
+    @property
+    def requests(self) -> int:
+        with self.__lock:
+            return len(self.__paths)
+
+    def record(self, path: str):
+        with self.__lock:
+            self.__paths.append(path)
+
+    def clear(self):
+        with self.__lock:
+            self.__paths = []
+
+    def start(self) -> 'CatalogServer':
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from beer.src.beer_artifact import BeerArtifact
+
+
+def make_artifact(rows: int = 3, columns: int = 4, source_hash: str = 'hash') -> BeerArtifact:
+    features = np.arange(rows * columns, dtype=np.float32).reshape(rows, columns)
+    names = [f'beer-{i}' for i in range(rows)]
+    lemmas = [{f'feature-{i}', 'пиво'} for i in range(columns)]
+    return BeerArtifact(features, names, [f'{x}.jpg' for x in names], lemmas, source_hash)
+
+
+def test_round_trip(tmp_path):
+    make_artifact().save(str(tmp_path))
+    artifact = BeerArtifact.load(str(tmp_path))
+
+    assert np.array_equal(artifact.features, make_artifact().features)
+    assert artifact.names == ['beer-0', 'beer-1', 'beer-2']
+    assert artifact.lemmas[1] == {'feature-1', 'пиво'}
+    assert artifact.source_hash == 'hash'
+
+
+def test_save_replaces_the_previous_artifact(tmp_path):
+    make_artifact(3, source_hash='old').save(str(tmp_path))
+    old = BeerArtifact.load(str(tmp_path))
+    make_artifact(5, source_hash='new').save(str(tmp_path))
+
+    artifact = BeerArtifact.load(str(tmp_path))
+    assert artifact.source_hash == 'new'
+    assert artifact.features.shape == (5, 4)
+    # The memory-mapped matrix of the old artifact is still readable
+    assert old.features.shape == (3, 4)
+    assert sorted(x for x in os.listdir(tmp_path) if x.endswith('.npy')) == \
+        [os.path.basename(artifact.features.filename)]
+    assert not any(x.endswith('.tmp') for x in os.listdir(tmp_path))
+
+
+def test_more_rows_than_columns(tmp_path):
+    make_artifact(rows=7, columns=2).save(str(tmp_path))
+    artifact = BeerArtifact.load(str(tmp_path))
+
+    assert artifact.features.shape == (7, 2)
+    assert len(artifact.names) == 7
+    assert artifact.lemmas == [{'feature-0', 'пиво'}, {'feature-1', 'пиво'}]
+
+
+def test_lemmas_must_match_columns(tmp_path):
+    artifact = make_artifact()
+    artifact.lemmas = artifact.lemmas[:3]
+    artifact.save(str(tmp_path))
+
+    assert BeerArtifact.load(str(tmp_path)) is None
+
+
+def test_rows_must_match_names(tmp_path):
+    artifact = make_artifact()
+    artifact.names = artifact.names[:2]
+    artifact.save(str(tmp_path))
+
+    assert BeerArtifact.load(str(tmp_path)) is None
+
+
+def test_missing_features_file(tmp_path):
+    make_artifact().save(str(tmp_path))
+    for name in os.listdir(tmp_path):
+        if name.endswith('.npy'):
+            os.remove(tmp_path / name)
+
+    assert BeerArtifact.load(str(tmp_path)) is None
@@ -0,0 +1,53 @@
+import time
+
+from features.cat_facts import CatFactGenerator
+
+
+def test_refill_survives_unexpected_errors(tmp_path, monkeypatch):
+    # The translation cache lives in ./cache
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def fetch_batch(self):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RuntimeError('unexpected')
+        return ['fact'] * 5
+
+    monkeypatch.setattr(CatFactGenerator, '_CatFactGenerator__fetch_batch', fetch_batch)
+    generator = CatFactGenerator(buffer_size=5, batch_size=5, retry_interval=0.05)
+
+    deadline = time.monotonic() + 5
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Let the worker put the batch into the buffer
+    time.sleep(0.1)
+
+    assert len(calls) >= 2
+    assert calls[1] - calls[0] >= 0.05
+    assert generator.sample() == 'fact'
+
+
+def test_sample_does_not_wait_for_failing_upstream(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    batches, singles = [], []
+
+    def fetch_batch(self):
+        batches.append(time.monotonic())
+        raise ConnectionError('catfact.ninja is down')
+
+    def fetch_one(self):
+        singles.append(time.monotonic())
+        return 'fact'
+
+    monkeypatch.setattr(CatFactGenerator, '_CatFactGenerator__fetch_batch', fetch_batch)
+    monkeypatch.setattr(CatFactGenerator, '_CatFactGenerator__fetch_one', fetch_one)
+    generator = CatFactGenerator(buffer_size=5, batch_size=5, retry_interval=10.)
+
+    deadline = time.monotonic() + 5
+    while len(batches) == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+    assert generator.sample() == 'Факты про кошек кончились :('
+    assert singles == []
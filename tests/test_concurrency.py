@@ -0,0 +1,33 @@
+import threading
+import time
+
+from concurrency import Defer, KeyedExecutor
+
+
+def test_deferred_task_frees_its_worker_and_keeps_key_order():
+    executor = KeyedExecutor(max_workers=1)
+    events = []
+    lock = threading.Lock()
+    attempts = {'slow': 0}
+
+    def task(name):
+        with lock:
+            if name == 'slow' and attempts['slow'] == 0:
+                attempts['slow'] += 1
+                raise Defer(0.2)
+            events.append(name)
+        return name
+
+    slow = executor.submit('a', task, 'slow')
+    after_slow = executor.submit('a', task, 'after-slow')
+    other = executor.submit('b', task, 'other')
+
+    # The only worker is free while 'slow' waits
+    assert other.result(timeout=1) == 'other'
+    assert not after_slow.done()
+
+    assert slow.result(timeout=2) == 'slow'
+    assert after_slow.result(timeout=2) == 'after-slow'
+    assert events == ['other', 'slow', 'after-slow']
+    assert executor.pending == 0
+    executor.shutdown()
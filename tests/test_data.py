@@ -0,0 +1,92 @@
+import io
+import zipfile
+
+import pytest
+
+import data
+
+ARCHIVE_FILES = {'data/beer.csv': 'name,style\nbeer-1,lager\n', 'data/README': 'beer'}
+
+
+def make_archive() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_:
+        for name, text in ARCHIVE_FILES.items():
+            zip_.writestr(name, text)
+    return buffer.getvalue()
+
+
+class Response:
+    def __init__(self, body: bytes, headers: dict):
+        self.status_code = 200
+        self.headers = headers
+        self.cookies = {}
+        self.__body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.__body), chunk_size):
+            yield self.__body[start:start + chunk_size]
+
+
+class Client:
+    def __init__(self, headers: dict):
+        self.headers = headers
+        self.calls = 0
+        self.body = make_archive()
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        return Response(self.body, self.headers)
+
+
+@pytest.fixture
+def drive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('GDRIVE_DATA_ID', 'file-id')
+    for name in ['BEER_DATA_ARCHIVE', 'GDRIVE_DATA_SHA256', 'BEER_DATA_REFRESH']:
+        monkeypatch.delenv(name, raising=False)
+
+    # Google Drive does not always send an ETag
+    client = Client(headers={})
+    monkeypatch.setattr(data, 'get_http_client', lambda: client)
+    return client
+
+
+def test_current_data_without_etag_is_not_downloaded_again(drive, tmp_path):
+    data.get_data()
+    assert drive.calls == 1
+    assert (tmp_path / 'beer' / 'data' / 'beer.csv').read_text() == ARCHIVE_FILES['data/beer.csv']
+
+    data.get_data()
+    assert drive.calls == 1
+
+
+def test_refresh_downloads_data_without_etag(drive, monkeypatch):
+    data.get_data()
+    data.get_data(refresh=True)
+    assert drive.calls == 2
+
+    monkeypatch.setenv('BEER_DATA_REFRESH', '1')
+    data.get_data()
+    assert drive.calls == 3
+
+
+def test_missing_file_is_downloaded_again(drive, tmp_path):
+    data.get_data()
+    (tmp_path / 'beer' / 'data' / 'README').unlink()
+
+    data.get_data()
+    assert drive.calls == 2
+    assert (tmp_path / 'beer' / 'data' / 'README').read_text() == ARCHIVE_FILES['data/README']
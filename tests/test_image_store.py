@@ -0,0 +1,26 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from beer.src.image_store import ImageStore
+
+
+def test_concurrent_first_requests_render_once(tmp_path):
+    source = str(tmp_path / 'beer.png')
+    Image.new('RGB', (2000, 1000), (200, 150, 50)).save(source)
+    store = ImageStore(str(tmp_path / 'cache'), max_size=640)
+    barrier = threading.Barrier(8)
+
+    def get(_):
+        barrier.wait()
+        return store.get(source)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        targets = set(executor.map(get, range(8)))
+
+    assert len(targets) == 1
+    with Image.open(targets.pop()) as img:
+        assert img.size == (640, 320)
+    assert not any(x.endswith('.tmp') for x in os.listdir(tmp_path / 'cache'))
@@ -0,0 +1,49 @@
+import pytest
+
+from intent_router import IntentRouter
+from lemmatizer import get_lemmatizer, tokenize
+
+
+class Handler:
+    def __init__(self, handler_name, triggers, prefix_triggers=()):
+        self.handler_name = handler_name
+        self.triggers = list(triggers)
+        self.prefix_triggers = list(prefix_triggers)
+
+
+# Same triggers as the text handlers
+HANDLERS = [
+    Handler('hello', ['привет', 'здарова', 'йоу', 'здравствовать', 'здравствуйте', 'прив', 'здаров'], ['прив']),
+    Handler('weather', ['погода', 'температура']),
+    Handler('cat', ['кошка', 'кот', 'котенок', 'котёнок', 'киска', 'котик', 'еще', 'ещё']),
+    Handler('beer', ['пиво', 'пивикс', 'пивчанский', 'пив', 'пиву'], ['пив']),
+    Handler('end', ['пока', 'досвидание', 'поки', 'досвидания', 'прощай']),
+]
+
+
+def route(tokens):
+    return [x.handler_name for x in IntentRouter(HANDLERS).route(tokens)]
+
+
+def test_tokenize_strips_punctuation():
+    assert tokenize('Какая завтра «погода»?! — ...') == ['Какая', 'завтра', 'погода']
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Какая завтра погода?', ['weather']),
+    ('Здравствуйте!', ['hello']),
+    ('Пока!', ['end']),
+    ('Расскажи про котиков!', ['cat']),
+    ('Ещё!', ['cat']),
+    ('Привет, хочу пива.', ['hello', 'beer']),
+])
+def test_punctuated_messages(text, expected):
+    assert route(get_lemmatizer().lemmatize(text)) == expected
+
+
+def test_router_normalizes_raw_tokens():
+    assert route(['Погода?', '(кот)']) == ['weather', 'cat']
+
+
+def test_unknown_message():
+    assert route(get_lemmatizer().lemmatize('Как дела?')) == []
@@ -0,0 +1,48 @@
+import threading
+import time
+
+from telegram.error import RetryAfter
+
+from replies import ReplySender
+
+
+def test_busy_groups_do_not_delay_private_chats():
+    sender = ReplySender(max_workers=2, global_rate=1000., group_rate=0.5, chat_burst=1)
+    # Every group can send once and then has to wait 2 seconds for its next token
+    for chat_id in range(-8, 0):
+        for _ in range(3):
+            sender.submit(chat_id, lambda: None)
+
+    time.sleep(0.1)
+    start = time.monotonic()
+    sender.submit(1, lambda: None).result(timeout=5)
+    assert time.monotonic() - start < 0.5
+    sender.shutdown(wait=False)
+
+
+def test_replies_keep_order_within_a_chat():
+    sender = ReplySender(max_workers=4, global_rate=1000., chat_rate=20., chat_burst=1)
+    sent = []
+    futures = [sender.submit(1, sent.append, i) for i in range(5)]
+
+    for future in futures:
+        future.result(timeout=5)
+    assert sent == list(range(5))
+    sender.shutdown()
+
+
+def test_flood_control_is_retried():
+    sender = ReplySender(max_workers=1, global_rate=1000.)
+    calls = []
+    lock = threading.Lock()
+
+    def send():
+        with lock:
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise RetryAfter(0.2)
+        return 'sent'
+
+    assert sender.submit(1, send).result(timeout=5) == 'sent'
+    assert calls[1] - calls[0] >= 0.2
+    sender.shutdown()
@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+
+from beer.src.scraper import BeerScraper
+from tests.catalog_server import CatalogServer
+
+PRODUCTS = 45
+
+
+@pytest.fixture
+def catalog():
+    catalog = CatalogServer(PRODUCTS).start()
+    yield catalog
+    catalog.stop()
+
+
+def scrape(catalog, path):
+    catalog.clear()
+    return BeerScraper(str(path), base_url=catalog.url, workers=4, requests_per_second=1000.).parse()
+
+
+def requested(catalog, prefix):
+    return [x for x in catalog.paths if x.startswith(prefix)]
+
+
+def test_scrapes_every_product(catalog, tmp_path):
+    data = scrape(catalog, tmp_path)
+
+    assert sorted(data) == sorted(f'beer-{i}' for i in range(PRODUCTS))
+    assert data['beer-7']['price'] == '70 руб.'
+    assert all(os.path.getsize(x['img']) > 0 for x in data.values())
+    with open(tmp_path / 'data.json') as f:
+        assert json.load(f) == data
+
+
+def test_resume_fetches_only_listing_pages(catalog, tmp_path):
+    first = scrape(catalog, tmp_path)
+    second = scrape(catalog, tmp_path)
+
+    assert second == first
+    assert len(catalog.paths) > 0
+    assert catalog.paths == requested(catalog, '/beer/all/')
+
+
+def test_truncated_checkpoint_line_is_tolerated(catalog, tmp_path):
+    scrape(catalog, tmp_path)
+    checkpoint = tmp_path / 'data.jsonl'
+    lines = checkpoint.read_text(encoding='utf8').splitlines(keepends=True)
+    lost = json.loads(lines[-1])['id']
+    # A run killed in the middle of writing its last record
+    checkpoint.write_text(''.join(lines[:-1]) + lines[-1][:len(lines[-1]) // 2], encoding='utf8')
+
+    data = scrape(catalog, tmp_path)
+
+    assert len(data) == PRODUCTS
+    assert requested(catalog, '/products/') == [f'/products/{lost}.html']
+
+
+def test_images_on_disk_are_not_downloaded_again(catalog, tmp_path):
+    scrape(catalog, tmp_path)
+    os.remove(tmp_path / 'data.jsonl')
+
+    data = scrape(catalog, tmp_path)
+
+    assert len(data) == PRODUCTS
+    assert len(requested(catalog, '/products/')) == PRODUCTS
+    assert requested(catalog, '/images/') == []
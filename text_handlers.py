@@ -1,5 +1,6 @@
 from typing import List
-import pymorphy2
+from lemmatizer import get_lemmatizer
+from intent_router import IntentRouter
 from features.weather import Weather
 from features.cat_facts import CatFactGenerator
 
@@ -9,16 +10,11 @@ class SuperTextHandler:
     Abstract handler
     """
     def __init__(self):
-        self._morph = pymorphy2.MorphAnalyzer()
+        self._lemmatizer = get_lemmatizer()
+        self.__router = None
 
-    def _lemmatize(self, text):
-        words = text.split()
-        res = list()
-        for word in words:
-            p = self._morph.parse(word)[0]
-            res.append(p.normal_form)
-
-        return res
+    def _lemmatize(self, text) -> List[str]:
+        return self._lemmatizer.lemmatize(text)
 
     @property
     def handler_name(self) -> str:
@@ -32,15 +28,35 @@ class SuperTextHandler:
     def _handler_triggers(self) -> List[str]:
         raise NotImplementedError()
 
-    def _get_message(self, message: str) -> str:
+    @property
+    def _handler_prefix_triggers(self) -> List[str]:
+        return []
+
+    @property
+    def triggers(self) -> List[str]:
+        return self._handler_triggers
+
+    @property
+    def prefix_triggers(self) -> List[str]:
+        return self._handler_prefix_triggers
+
+    def _get_message(self, message: str, tokens: List[str]) -> str:
         raise NotImplementedError()
 
-    def get(self, message: str) -> (bool, str):
-        tokens = ' '.join(self._lemmatize(message))
-        trigger = any(word in tokens for word in self._handler_triggers)
+    def get_message(self, message: str, tokens: List[str]) -> str:
+        return self._get_message(message, tokens)
+
+    def get(self, message: str, tokens: List[str] = None) -> (bool, str):
+        if tokens is None:
+            tokens = self._lemmatize(message)
+
+        if self.__router is None:
+            self.__router = IntentRouter([self])
+
+        trigger = len(self.__router.route(tokens)) > 0
 
         if trigger:
-            return trigger, self._get_message(message)
+            return trigger, self._get_message(message, tokens)
 
         return trigger, None
 
@@ -63,7 +79,11 @@ class HelloTextHandler(SuperTextHandler):
                 'здравствовать', 'здравствуйте', 'прив',
                 'здаров']
 
-    def _get_message(self, message: str) -> str:
+    @property
+    def _handler_prefix_triggers(self) -> List[str]:
+        return ['прив']
+
+    def _get_message(self, message: str, tokens: List[str]) -> str:
         return self.__message
 
 
@@ -88,7 +108,7 @@ class EndTextHandler(SuperTextHandler):
         return ['пока', 'досвидание', 'поки',
                 'досвидания', 'прощай']
 
-    def _get_message(self, message: str) -> str:
+    def _get_message(self, message: str, tokens: List[str]) -> str:
         return self.__message
 
 
@@ -108,8 +128,8 @@ class WeatherTextHandler(SuperTextHandler):
     def _handler_triggers(self) -> List[str]:
         return ['погода', 'температура']
 
-    def _get_message(self, message: str) -> str:
-        return self.__weather.get_weather(message)
+    def _get_message(self, message: str, tokens: List[str]) -> str:
+        return self.__weather.get_weather(message, tokens)
 
 
 class BeerTextHandler(SuperTextHandler):
@@ -131,7 +151,11 @@ class BeerTextHandler(SuperTextHandler):
     def _handler_triggers(self) -> List[str]:
         return ['пиво', 'пивикс', 'пивчанский', 'пив', 'пиву']
 
-    def _get_message(self, message: str) -> str:
+    @property
+    def _handler_prefix_triggers(self) -> List[str]:
+        return ['пив']
+
+    def _get_message(self, message: str, tokens: List[str]) -> str:
         return 'Какое пиво ты бы хотел?'
 
 
@@ -153,7 +177,7 @@ class CatTextHandler(SuperTextHandler):
 
     @property
     def _handler_triggers(self) -> List[str]:
-        return ['кошка', 'кот', 'котенок', 'киска', 'котик', 'еще', 'ещё']
+        return ['кошка', 'кот', 'котенок', 'котёнок', 'киска', 'котик', 'еще', 'ещё']
 
-    def _get_message(self, message: str) -> str:
+    def _get_message(self, message: str, tokens: List[str]) -> str:
         return 'Интересный факт про котиков: ' + self.__generator.sample()